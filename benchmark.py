@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+性能基准测试：生成指定规模的合成参数扫描目录（prmtric.N/case.K/{output.txt, airgapflux.csv}），
+分阶段计时处理流程，结果保存为JSON，并可与保存的基准结果比较、标出性能退化的阶段
+
+用法:
+    python benchmark.py --cases 1000 --points 501 --output bench.json
+    python benchmark.py --cases 1000 --points 501 --baseline bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import warnings
+import platform
+import tempfile
+import numpy as np
+from typing import Callable, Dict, List, Optional
+
+
+# 合成波形的参数：极距（mm）、每极对应的定子槽数（齿槽谐波为Q±1、2Q±1次）
+POLE_PITCH = 106.562778988
+SLOTS_PER_POLE = 18
+
+# 比较时忽略绝对差值小于该值（秒）的阶段，避免计时噪声误报
+MIN_REGRESSION_SECONDS = 0.005
+
+# 比较前必须一致的测试条件（meta中的字段），条件不同时各阶段耗时没有可比性
+COMPARABLE_META = ('n_cases', 'harmonic_filter_n', 'engine', 'fast_ingest', 'plot_cases')
+
+# 计时的阶段（按执行顺序）
+STAGES = ['discover', 'parse', 'process_airgap_flux', 'ksat_ratios', 'add_case',
+          'get_case_summary', 'save_to_csv', 'plot_curves', 'render_waveforms']
+
+
+def synthetic_waveform(n_points: int, rng: np.random.Generator) -> tuple:
+    """
+    生成一个开槽气隙的半周期磁密波形及对应的Hm_dr、Hm_ds
+    励磁磁密为平顶波，乘以定子开槽引起的气隙磁导波动（Q、2Q次），半周期从-B到+B，满足半波对称；
+    幅值、平顶程度和Hm_dr、Hm_ds随饱和程度增加，数值范围与prmtric.1相近（Ksat约1.0 ~ 3.5）
+    Returns:
+        (length数组, Bn数组, hm_dr, hm_ds)
+    """
+    theta = np.linspace(0.0, np.pi, n_points)
+    saturation = rng.uniform(0.0, 1.0)
+    amplitude = 0.2 + 0.6 * saturation
+    flat_top = 0.5 + 2.5 * saturation
+    mmf = -amplitude * np.tanh(flat_top * np.cos(theta)) / np.tanh(flat_top)
+    slot_phase = rng.uniform(0, 2 * np.pi)
+    permeance = (1 - rng.uniform(0.1, 0.3) * np.cos(SLOTS_PER_POLE * theta + slot_phase)
+                 - rng.uniform(0.02, 0.1) * np.cos(2 * SLOTS_PER_POLE * theta + 2 * slot_phase))
+    bn = mmf * permeance + rng.normal(0, 1e-3, n_points)
+    length = np.linspace(0.0, POLE_PITCH, n_points)
+    
+    # 饱和越深，齿部和轭部所需磁场强度越大
+    hm_dr = 60 * np.exp(6 * saturation ** 2) * rng.uniform(0.9, 1.1)
+    hm_ds = 45 * np.exp(3.5 * saturation ** 2) * rng.uniform(0.9, 1.1)
+    return length, bn, hm_dr, hm_ds
+
+
+def generate_sweep(base_dir: str, n_cases: int, n_points: int = 501, seed: int = 0) -> str:
+    """
+    生成合成参数扫描目录，结构与prmtric.1相同
+    Args:
+        base_dir: 输出目录，如"prmtric.9"
+        n_cases: case数
+        n_points: 每个case的半周期采样点数
+        seed: 随机数种子
+    Returns:
+        base_dir
+    """
+    rng = np.random.default_rng(seed)
+    for case_id in range(n_cases):
+        case_dir = os.path.join(base_dir, f"case.{case_id}")
+        os.makedirs(case_dir, exist_ok=True)
+        length, bn, hm_dr, hm_ds = synthetic_waveform(n_points, rng)
+        with open(os.path.join(case_dir, "output.txt"), 'w', encoding='utf-8') as f:
+            f.write(f"Hm_dr = {float(hm_dr)!r}\nHm_ds = {float(hm_ds)!r}\n")
+        np.savetxt(os.path.join(case_dir, "airgapflux.csv"), np.column_stack([length, bn]),
+                   fmt='%.12g', delimiter=',', header='length,Bn', comments='')
+    return base_dir
+
+
+def _timed(timings: Dict[str, List[float]], stage: str, func: Callable, *args):
+    """执行func并将耗时记入timings[stage]"""
+    start = time.perf_counter()
+    result = func(*args)
+    timings.setdefault(stage, []).append(time.perf_counter() - start)
+    return result
+
+
+def run_benchmark(base_dir: str, harmonic_filter_n: int = 5, engine: str = 'full',
+                  fast_ingest: bool = False, repeat: int = 3, plot_cases: int = 4) -> Dict:
+    """
+    分阶段计时处理流程，每个阶段取repeat次运行中的最短耗时
+    Args:
+        base_dir: 参数扫描目录
+        harmonic_filter_n: 谐波滤波次数
+        engine: 计算引擎，见data_processor.FLUX_ENGINES
+        fast_ingest: 是否使用快速读取
+        repeat: 重复次数
+        plot_cases: render_waveforms阶段渲染的case数
+    Returns:
+        包含meta（测试条件）和stages（各阶段耗时，秒）的字典
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import visualization
+    from data_processor import DataProcessor
+    from waveform_display import render_waveforms
+    
+    # 字体缺少中文字形的警告与计时无关
+    warnings.filterwarnings('ignore', message='Glyph .* missing from font')
+    
+    timings: Dict[str, List[float]] = {}
+    n_cases = 0
+    for _ in range(repeat):
+        output_dir = tempfile.mkdtemp(prefix="ksat_bench_out_")
+        try:
+            processor = DataProcessor(base_dir, fast_ingest=fast_ingest, engine=engine)
+            case_dirs = _timed(timings, 'discover', processor.get_case_directories)
+            loaded = _timed(timings, 'parse', lambda: [processor.load_case(case_dir) for case_dir in case_dirs])
+            case_list = [case_data for case_data in loaded if case_data is not None]
+            
+            def process_flux():
+                for case_data in case_list:
+                    case_data.process_airgap_flux(harmonic_filter_n, engine)
+            
+            def ksat_ratios():
+                for case_data in case_list:
+                    case_data.calculate_ksat()
+                    case_data.calculate_ratios()
+            
+            def add_cases():
+                for case_data in case_list:
+                    processor.add_case(case_data)
+            
+            def plot_curves():
+                visualization.create_comprehensive_plot(valid_data)
+                visualization.create_kw_plot(valid_data)
+                visualization.create_alpha_knm_plot(valid_data)
+            
+            _timed(timings, 'process_airgap_flux', process_flux)
+            _timed(timings, 'ksat_ratios', ksat_ratios)
+            _timed(timings, 'add_case', add_cases)
+            _timed(timings, 'get_case_summary', processor.get_case_summary)
+            _timed(timings, 'save_to_csv', processor.save_to_csv, "calculated_results.csv", output_dir)
+            
+            # 曲线图输出到临时目录，不覆盖output_results中的结果
+            visualization.OUTPUT_DIR = output_dir
+            valid_data = visualization.select_valid_data(processor)
+            _timed(timings, 'plot_curves', plot_curves)
+            case_ids = [case_data.case_id for case_data in case_list[:plot_cases]]
+            # 不使用磁盘缓存：每次重复都计时相同的读取和计算，也不在当前目录留下临时扫描目录的缓存
+            _timed(timings, 'render_waveforms', render_waveforms, case_ids, base_dir, output_dir,
+                   150, harmonic_filter_n, 1, True, None, None)
+            n_cases = len(case_list)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+    
+    stages = {stage: {'seconds': min(timings[stage]), 'runs': timings[stage]} for stage in STAGES}
+    return {
+        'meta': {
+            'base_dir': base_dir,
+            'n_cases': n_cases,
+            'harmonic_filter_n': harmonic_filter_n,
+            'engine': engine,
+            'fast_ingest': fast_ingest,
+            'repeat': repeat,
+            'plot_cases': plot_cases,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'stages': stages,
+        'total': sum(stage['seconds'] for stage in stages.values()),
+    }
+
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = 0.10) -> List[Dict]:
+    """
+    与基准结果逐阶段比较，测试条件（COMPARABLE_META）与基准不同时抛出ValueError
+    Args:
+        threshold: 允许的相对变慢比例，超过该比例（且绝对差值不小于MIN_REGRESSION_SECONDS）视为退化
+    Returns:
+        每个阶段的比较结果列表，regression为True表示退化
+    """
+    baseline_meta = baseline.get('meta', {})
+    mismatched = [f"{key}={current['meta'].get(key)}（基准 {baseline_meta.get(key)}）"
+                  for key in COMPARABLE_META if current['meta'].get(key) != baseline_meta.get(key)]
+    if mismatched:
+        raise ValueError(f"测试条件与基准结果不同，无法比较: {', '.join(mismatched)}")
+    
+    rows = []
+    for stage in STAGES:
+        if stage not in current['stages'] or stage not in baseline['stages']:
+            continue
+        now = current['stages'][stage]['seconds']
+        before = baseline['stages'][stage]['seconds']
+        ratio = now / before if before > 0 else float('inf')
+        rows.append({
+            'stage': stage,
+            'baseline': before,
+            'current': now,
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold and now - before >= MIN_REGRESSION_SECONDS,
+        })
+    return rows
+
+
+def print_results(result: Dict, comparison: Optional[List[Dict]] = None):
+    """输出各阶段耗时，有比较结果时同时输出基准耗时和变化"""
+    meta = result['meta']
+    print(f"{meta['n_cases']} 个case, engine={meta['engine']}, fast_ingest={meta['fast_ingest']}, "
+          f"harmonic_filter_n={meta['harmonic_filter_n']}")
+    if comparison is None:
+        for stage in STAGES:
+            print(f"  {stage:<22}{result['stages'][stage]['seconds']:>10.4f} s")
+    else:
+        for row in comparison:
+            flag = "  <-- 退化" if row['regression'] else ""
+            print(f"  {row['stage']:<22}{row['current']:>10.4f} s  基准 {row['baseline']:>10.4f} s  "
+                  f"x{row['ratio']:.2f}{flag}")
+    print(f"  {'total':<22}{result['total']:>10.4f} s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Ksat处理流程的分阶段性能基准测试")
+    parser.add_argument('--cases', type=int, default=200, help="合成case数")
+    parser.add_argument('--points', type=int, default=501, help="每个case的采样点数")
+    parser.add_argument('--seed', type=int, default=0, help="合成数据的随机数种子")
+    parser.add_argument('--sweep-dir', default=None,
+                        help="参数扫描目录：已存在时直接使用，否则在此生成合成数据（默认生成到临时目录，结束后删除）")
+    parser.add_argument('--harmonic-filter-n', type=int, default=5, help="谐波滤波次数")
+    parser.add_argument('--engine', default='full', help="计算引擎")
+    parser.add_argument('--fast-ingest', action='store_true', help="使用快速读取")
+    parser.add_argument('--repeat', type=int, default=3, help="重复次数，各阶段取最短耗时")
+    parser.add_argument('--plot-cases', type=int, default=4, help="波形渲染阶段的case数")
+    parser.add_argument('--output', default=None, help="结果JSON文件")
+    parser.add_argument('--baseline', default=None, help="用于比较的基准结果JSON文件")
+    parser.add_argument('--threshold', type=float, default=0.10, help="判定为退化的相对变慢比例")
+    args = parser.parse_args(argv)
+    
+    sweep_dir = args.sweep_dir
+    temporary = sweep_dir is None
+    if temporary:
+        sweep_dir = os.path.join(tempfile.mkdtemp(prefix="ksat_bench_"), "prmtric.1")
+    try:
+        if not os.path.isdir(sweep_dir):
+            generate_sweep(sweep_dir, args.cases, args.points, args.seed)
+        result = run_benchmark(sweep_dir, args.harmonic_filter_n, args.engine, args.fast_ingest,
+                               args.repeat, args.plot_cases)
+    finally:
+        if temporary:
+            shutil.rmtree(os.path.dirname(sweep_dir), ignore_errors=True)
+    
+    comparison = None
+    mismatch = None
+    if args.baseline is not None:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        try:
+            comparison = compare_results(result, baseline, args.threshold)
+        except ValueError as e:
+            mismatch = str(e)
+    print_results(result, comparison)
+    if mismatch is not None:
+        print(mismatch, file=sys.stderr)
+    
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"结果已保存到: {args.output}")
+    
+    if mismatch is not None:
+        return 2
+    if comparison is not None and any(row['regression'] for row in comparison):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
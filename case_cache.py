@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+case结果的磁盘缓存：每个case保存为一个紧凑的二进制文件，
+包含解析出的Hm值、气隙磁密数据、FFT频谱（或sparse引擎的谐波系数、half_wave引擎的半波频谱）和计算结果。
+缓存以case目录路径和处理参数为键，并记录输入文件的大小和修改时间，
+输入文件变化后缓存自动失效。
+"""
+
+import os
+import glob
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+from typing import Dict, Optional
+
+
+# 缓存中保存的标量结果
+SCALAR_FIELDS = ['hm_dr', 'hm_ds', 'hm_delta', 'ksat', 'b_av', 'b_delta1',
+                 'b_delta', 'alpha_i', 'k_nm', 'k_w']
+
+# 参与校验的输入文件
+INPUT_FILES = ['output.txt', 'airgapflux.csv']
+
+# 缓存文件标识和扩展名
+MAGIC = b'KSATCACHE1\n'
+CACHE_EXT = ".kcache"
+
+
+class CaseCache:
+    """case处理结果的磁盘缓存"""
+    
+    def __init__(self, cache_dir: str = ".ksat_cache", max_age: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_age: 缓存文件最长保留时间（秒），None表示不限制
+            max_bytes: 缓存目录总大小上限（字节），None表示不限制
+        """
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    @staticmethod
+    def fingerprint(case_dir: str) -> Optional[list]:
+        """获取case输入文件的路径、大小和修改时间，文件缺失时返回None"""
+        result = []
+        for name in INPUT_FILES:
+            path = os.path.abspath(os.path.join(case_dir, name))
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            result.append([path, stat.st_size, stat.st_mtime_ns])
+        return result
+    
+    def entry_path(self, case_dir: str, params: dict) -> str:
+        """缓存文件路径：case目录的哈希 + 处理参数的哈希"""
+        dir_hash = hashlib.sha1(os.path.abspath(case_dir).encode('utf-8')).hexdigest()[:16]
+        param_hash = hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.cache_dir, f"{dir_hash}_{param_hash}{CACHE_EXT}")
+    
+    def load(self, case_dir: str, params: dict) -> Optional[Dict]:
+        """
+        读取缓存，缓存不存在或输入文件已变化时返回None
+        Returns:
+            包含case_id、标量结果、气隙磁密各列（columns）、频谱（spectrum）、谐波系数（harmonics）
+            和半波频谱（half_spectrum）的字典
+        """
+        path = self.entry_path(case_dir, params)
+        try:
+            with open(path, 'rb') as f:
+                buffer = bytearray(os.fstat(f.fileno()).st_size)
+                f.readinto(buffer)
+        except OSError:
+            return None
+        
+        try:
+            if buffer[:len(MAGIC)] != MAGIC:
+                return None
+            header_len = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 4], 'little')
+            offset = len(MAGIC) + 4
+            header = json.loads(buffer[offset:offset + header_len].decode('utf-8'))
+            if header['fingerprint'] != self.fingerprint(case_dir):
+                return None
+            offset += header_len
+            
+            # 标量结果、气隙磁密各列、频谱、谐波系数和半波频谱依次连续存放
+            scalars = np.frombuffer(buffer, dtype='<f8', count=len(SCALAR_FIELDS), offset=offset)
+            offset += scalars.nbytes
+            entry = {'case_id': header['case_id']}
+            for field, value in zip(SCALAR_FIELDS, scalars):
+                entry[field] = None if np.isnan(value) else value
+            
+            n_rows = header['n_rows']
+            if header['columns'] is None:
+                entry['columns'] = None
+            else:
+                entry['columns'] = {}
+                for name in header['columns']:
+                    entry['columns'][name] = np.frombuffer(buffer, dtype='<f8', count=n_rows, offset=offset)
+                    offset += 8 * n_rows
+            n_spectrum = header['n_spectrum']
+            entry['spectrum'] = np.frombuffer(buffer, dtype='<c16', count=n_spectrum, offset=offset) if n_spectrum else None
+            offset += 16 * n_spectrum
+            n_harmonics = header.get('n_harmonics', 0)
+            entry['harmonics'] = np.frombuffer(buffer, dtype='<c16', count=n_harmonics, offset=offset) if n_harmonics else None
+            offset += 16 * n_harmonics
+            n_half_spectrum = header.get('n_half_spectrum', 0)
+            entry['half_spectrum'] = (np.frombuffer(buffer, dtype='<c16', count=n_half_spectrum, offset=offset)
+                                      if n_half_spectrum else None)
+        except Exception as e:
+            return None
+        
+        # 更新访问时间，淘汰时优先删除最久未使用的缓存
+        os.utime(path)
+        return entry
+    
+    def store(self, case_dir: str, params: dict, case_data) -> None:
+        """将CaseData的计算结果写入缓存"""
+        fingerprint = self.fingerprint(case_dir)
+        if fingerprint is None:
+            return
+        
+        columns = case_data.flux_columns
+        harmonics = case_data.harmonics
+        half_spectrum = case_data.half_spectrum
+        # 有半波频谱时不保存完整频谱，读取后再恢复
+        spectrum = case_data.spectrum if half_spectrum is None else None
+        try:
+            header = {
+                'fingerprint': fingerprint,
+                'case_id': case_data.case_id,
+                'columns': None if columns is None else [str(name) for name in columns],
+                'n_rows': len(next(iter(columns.values()))) if columns else 0,
+                'n_spectrum': 0 if spectrum is None else len(spectrum),
+                'n_harmonics': 0 if harmonics is None else len(harmonics),
+                'n_half_spectrum': 0 if half_spectrum is None else len(half_spectrum),
+            }
+            header_bytes = json.dumps(header).encode('utf-8')
+            scalars = np.array([np.nan if getattr(case_data, field) is None else getattr(case_data, field)
+                                for field in SCALAR_FIELDS], dtype='<f8')
+            chunks = [MAGIC, len(header_bytes).to_bytes(4, 'little'), header_bytes, scalars.tobytes()]
+            if columns is not None:
+                chunks.extend(np.asarray(values, dtype='<f8').tobytes() for values in columns.values())
+            if spectrum is not None:
+                chunks.append(np.asarray(spectrum, dtype='<c16').tobytes())
+            if harmonics is not None:
+                chunks.append(np.asarray(harmonics, dtype='<c16').tobytes())
+            if half_spectrum is not None:
+                chunks.append(np.asarray(half_spectrum, dtype='<c16').tobytes())
+        except Exception as e:
+            # 无法转换为数值数组的数据不进行缓存
+            return
+        
+        # 先写临时文件再替换，避免中断时留下损坏的缓存
+        path = self.entry_path(case_dir, params)
+        tmp_path = path + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(b''.join(chunks))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def invalidate(self, case_dir: str) -> None:
+        """删除指定case目录在所有处理参数下的缓存"""
+        prefix = self.entry_path(case_dir, {}).rsplit('_', 1)[0]
+        for path in glob.glob(prefix + "_*" + CACHE_EXT):
+            os.remove(path)
+    
+    def clear(self) -> None:
+        """清空缓存目录"""
+        for path in glob.glob(os.path.join(self.cache_dir, "*" + CACHE_EXT)):
+            os.remove(path)
+    
+    def total_bytes(self) -> int:
+        """缓存目录中缓存文件的总大小"""
+        return sum(os.path.getsize(path) for path in glob.glob(os.path.join(self.cache_dir, "*" + CACHE_EXT)))
+    
+    def evict(self, max_age: Optional[float] = None, max_bytes: Optional[int] = None) -> int:
+        """
+        按保留时间和总大小淘汰缓存，未指定时使用初始化时的设置
+        先删除超过max_age未使用的文件，再按最久未使用的顺序删除直到总大小不超过max_bytes
+        Returns:
+            删除的缓存文件数
+        """
+        max_age = self.max_age if max_age is None else max_age
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*" + CACHE_EXT)):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        
+        removed = 0
+        now = time.time()
+        if max_age is not None:
+            kept = []
+            for mtime, size, path in entries:
+                if now - mtime > max_age:
+                    os.remove(path)
+                    removed += 1
+                else:
+                    kept.append((mtime, size, path))
+            entries = kept
+        
+        if max_bytes is not None:
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, path in entries:
+                if total <= max_bytes:
+                    break
+                os.remove(path)
+                total -= size
+                removed += 1
+        
+        return removed
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+计算结果的二进制列式导出：每个汇总指标和每种波形各存为一个原始小端序数组文件，读取时以内存映射方式打开
+目录结构（如output_results/calculated_results.ksatcols/）：
+    meta.json                  版本、指标列表、波形列表、已提交的行数和各波形的数据点总数
+    case_id.i8, ksat.f8, ...   每个汇总指标一个文件，按写入顺序存放
+    <波形名>.f8                所有case的波形数据连续存放
+    <波形名>.idx               每个case一条(offset, count)记录，count为-1表示该case没有该波形
+追加新case时只在各文件末尾写入新数据，最后替换meta.json提交；
+中断时meta.json仍为上一次提交的状态，多写入的数据在下次追加时被截掉
+"""
+
+import os
+import sys
+import json
+import numpy as np
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+from result_store import RESULT_FIELDS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+COLUMNAR_VERSION = 1
+COLUMNAR_EXT = ".ksatcols"
+META_FILE = "meta.json"
+
+# 可导出的波形：完整周期数据和滤波后的信号
+WAVEFORM_FIELDS = ('full_cycle_flux', 'filtered_signal')
+
+
+def _read_meta(path: str) -> Optional[Dict]:
+    """读取目录中的meta.json，不存在时返回None"""
+    meta_file = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') != COLUMNAR_VERSION:
+        raise ValueError(f"不支持的导出格式版本: {meta.get('version')}")
+    return meta
+
+
+def _write_meta(path: str, meta: Dict):
+    """先写临时文件再替换，保证meta.json总是完整的"""
+    tmp_file = os.path.join(path, META_FILE + ".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_file, os.path.join(path, META_FILE))
+
+
+def _append_array(file_path: str, committed_bytes: int, arrays: Iterable[np.ndarray]):
+    """将文件截断到已提交的长度后依次追加数组"""
+    with open(file_path, 'ab') as f:
+        f.truncate(committed_bytes)
+        for values in arrays:
+            values.tofile(f)
+
+
+def append_cases(path: str, case_list: List, waveforms: Iterable[str] = WAVEFORM_FIELDS) -> int:
+    """
+    将case结果追加到列式导出目录，目录不存在时创建；已导出过的case编号跳过
+    Args:
+        path: 导出目录
+        case_list: CaseData列表，按此顺序写入
+        waveforms: 导出的波形，见WAVEFORM_FIELDS；只在创建目录时生效，之后沿用已有目录的设置
+    Returns:
+        新写入的case数
+    """
+    meta = _read_meta(path)
+    if meta is None:
+        waveforms = list(waveforms)
+        for name in waveforms:
+            if name not in WAVEFORM_FIELDS:
+                raise ValueError(f"未知的波形: {name}")
+        os.makedirs(path, exist_ok=True)
+        meta = {
+            'version': COLUMNAR_VERSION,
+            'fields': RESULT_FIELDS,
+            'waveforms': waveforms,
+            'n_rows': 0,
+            'n_values': {name: 0 for name in waveforms},
+        }
+    
+    n_rows = meta['n_rows']
+    existing = set(ColumnarExport(path).case_ids.tolist()) if n_rows else set()
+    new_cases = []
+    for case_data in case_list:
+        case_id = int(case_data.case_id)
+        if case_id not in existing:
+            existing.add(case_id)
+            new_cases.append(case_data)
+    if not new_cases and n_rows:
+        return 0
+    
+    # 汇总指标：每列一个文件
+    case_ids = np.array([int(case_data.case_id) for case_data in new_cases], dtype='<i8')
+    _append_array(os.path.join(path, "case_id.i8"), 8 * n_rows, [case_ids])
+    for field in meta['fields']:
+        values = np.array([np.nan if getattr(case_data, field) is None else getattr(case_data, field)
+                           for case_data in new_cases], dtype='<f8')
+        _append_array(os.path.join(path, f"{field}.f8"), 8 * n_rows, [values])
+    
+    # 波形：数据连续存放，索引记录每个case的起点和长度
+    for name in meta['waveforms']:
+        n_values = meta['n_values'][name]
+        index = np.full((len(new_cases), 2), -1, dtype='<i8')
+        data = []
+        for i, case_data in enumerate(new_cases):
+            values = getattr(case_data, name)
+            if values is None:
+                continue
+            values = np.ascontiguousarray(values, dtype='<f8')
+            index[i] = (n_values, len(values))
+            n_values += len(values)
+            data.append(values)
+        _append_array(os.path.join(path, f"{name}.f8"), 8 * meta['n_values'][name], data)
+        _append_array(os.path.join(path, f"{name}.idx"), 16 * n_rows, [index])
+        meta['n_values'][name] = n_values
+    
+    meta['n_rows'] = n_rows + len(new_cases)
+    _write_meta(path, meta)
+    return len(new_cases)
+
+
+class ColumnarExport:
+    """以内存映射方式打开的列式导出目录（只包含最近一次提交的数据）"""
+    
+    def __init__(self, path: str):
+        meta = _read_meta(path)
+        if meta is None:
+            raise ValueError(f"不是有效的导出目录: {path}")
+        self.path = path
+        self.fields: List[str] = meta['fields']
+        self.waveforms: List[str] = meta['waveforms']
+        self.n_rows: int = meta['n_rows']
+        self._n_values: Dict[str, int] = meta['n_values']
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._rows: Optional[Dict[int, int]] = None
+    
+    def __len__(self) -> int:
+        return self.n_rows
+    
+    def __contains__(self, case_id) -> bool:
+        return self.row_of(case_id) is not None
+    
+    def _map(self, filename: str, dtype: str, count: int) -> np.ndarray:
+        """内存映射文件开头的count个元素（只读）"""
+        array = self._arrays.get(filename)
+        if array is None:
+            if count == 0:
+                array = np.empty(0, dtype=dtype)
+            else:
+                array = np.memmap(os.path.join(self.path, filename), dtype=dtype, mode='r', shape=(count,))
+            self._arrays[filename] = array
+        return array
+    
+    @property
+    def case_ids(self) -> np.ndarray:
+        """所有case编号（按写入顺序）"""
+        return self._map("case_id.i8", '<i8', self.n_rows)
+    
+    def column(self, field: str) -> np.ndarray:
+        """指定指标的数组（内存映射），缺失值为NaN"""
+        if field not in self.fields:
+            raise KeyError(field)
+        return self._map(f"{field}.f8", '<f8', self.n_rows)
+    
+    def row_of(self, case_id) -> Optional[int]:
+        """case编号对应的行号，不存在时返回None"""
+        if self._rows is None:
+            self._rows = {case_id: row for row, case_id in enumerate(self.case_ids.tolist())}
+        return self._rows.get(int(case_id))
+    
+    def to_frame(self, fields: Optional[List[str]] = None) -> 'pd.DataFrame':
+        """汇总结果的DataFrame，各列直接引用内存映射数组"""
+        import pandas as pd
+        fields = self.fields if fields is None else fields
+        data = {'case_id': self.case_ids}
+        for field in fields:
+            data[field] = self.column(field)
+        return pd.DataFrame(data, copy=False)
+    
+    def _waveform_index(self, name: str) -> np.ndarray:
+        if name not in self.waveforms:
+            raise KeyError(name)
+        return self._map(f"{name}.idx", '<i8', 2 * self.n_rows).reshape(-1, 2)
+    
+    def waveform(self, name: str, case_id) -> Optional[np.ndarray]:
+        """指定case的波形（内存映射上的视图），该case不存在或没有该波形时返回None"""
+        row = self.row_of(case_id)
+        if row is None:
+            return None
+        offset, count = (int(value) for value in self._waveform_index(name)[row])
+        if count < 0:
+            return None
+        return self._map(f"{name}.f8", '<f8', self._n_values[name])[offset:offset + count]
+    
+    def waveform_matrix(self, name: str) -> np.ndarray:
+        """
+        所有case的波形组成的(case数, 采样点数)矩阵，为内存映射上的视图（不复制数据）
+        要求所有case都有该波形且长度相同、按行连续存放
+        """
+        index = self._waveform_index(name)
+        data = self._map(f"{name}.f8", '<f8', self._n_values[name])
+        if self.n_rows == 0:
+            return data.reshape(0, 0)
+        n_points = int(index[0, 1])
+        expected = np.arange(self.n_rows) * n_points
+        if n_points < 0 or np.any(index[:, 1] != n_points) or np.any(index[:, 0] != expected):
+            raise ValueError(f"{name}的各case长度不一致或有缺失，无法构成矩阵")
+        return data[:self.n_rows * n_points].reshape(self.n_rows, n_points)
+
+
+if __name__ == "__main__":
+    # 用法: python columnar_export.py [参数扫描目录或打包文件] [导出目录]
+    from data_processor import DataProcessor
+    from case_cache import CaseCache
+    
+    base_dir = sys.argv[1] if len(sys.argv) > 1 else "prmtric.1"
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else "calculated_results" + COLUMNAR_EXT
+    processor = DataProcessor(base_dir, cache=CaseCache(), fast_ingest=True)
+    processor.process_all_cases(harmonic_filter_n=5, batch=True)
+    n_new = append_cases(out_dir, sorted(processor.cases.values(), key=lambda case_data: int(case_data.case_id)))
+    print(f"已追加 {n_new} 个case到 {out_dir}（共 {len(ColumnarExport(out_dir))} 个）")
@@ -1,37 +1,773 @@
 import os
-import pandas as pd
+import copy
+import json
+import time
 import glob
 import re
 import numpy as np
-from typing import Dict, List, Optional
+from contextlib import nullcontext
+from functools import lru_cache
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from case_cache import CaseCache
+from columnar_export import COLUMNAR_EXT, WAVEFORM_FIELDS, append_cases
+from packed_sweep import PackedSweep
+from pipeline_metrics import PipelineMetrics, stage_timer
+from result_store import RESULT_FIELDS, ResultStore, format_csv_value
+from sharding import shard_of, sweep_name
+from waveform_cache import WaveformCache
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple
+
+# pandas只在构造DataFrame（读取不规则的CSV、汇总表格等）时导入，纯数值处理不需要加载pandas
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# 真空磁导率 μ₀ = 4π × 10⁻⁷ H/m
+MU_0 = 4 * np.pi * 1e-7
+
+# 饱和系数计算使用的默认几何尺寸（mm）：转子齿高、定子齿高、气隙长度
+ROTOR_TOOTH_HEIGHT = 23.6
+STATOR_TOOTH_HEIGHT = 27
+AIR_GAP = 0.4
+
+# 批量计算时同一采样点数的最少case数，不足时退回逐个处理
+BATCH_MIN_GROUP = 2
+
+# 气隙磁密特征值的计算引擎：
+#   full      - 显式延拓为完整周期后做FFT（原始算法）
+#   half_wave - 利用半波对称性直接由半周期数据计算，不构造延拓数据，正变换长度减半，只保存奇次谐波
+#   sparse    - 只计算保留的低次谐波系数，滤波后波形的峰值由迭代精确求解（适用于较小的滤波次数）
+FLUX_ENGINES = ('full', 'half_wave', 'sparse')
+
+# sparse引擎粗搜索峰值时每个保留谐波对应的采样点数和Halley迭代次数
+# （网格足够密，一次三阶收敛的迭代后再以三次模型修正，峰值误差已在舍入误差量级）
+SPARSE_GRID_FACTOR = 16
+SPARSE_REFINE_STEPS = 1
+
+# sparse引擎保留的谐波不超过该数目时，粗搜索由预先计算的余弦表直接求网格上的波形，否则用irfft
+SPARSE_TABLE_MAX = 64
+
+# half_wave引擎滤波后保留的奇次谐波不超过该数目时，由合成矩阵直接求滤波后信号的奇次谐波部分，不做反变换
+HALF_WAVE_DIRECT_MAX = 16
+
+# 流式处理时每个并行worker一次处理的case数
+STREAM_BLOCK_SIZE = 64
+
+# output.txt中Hm_dr、Hm_ds参数的匹配模式（一次扫描同时匹配两个参数）
+HM_PATTERN = re.compile(r'(Hm_dr|Hm_ds)\s*=\s*([\d.-]+)')
+
+
+def extend_half_cycle(bn_data: np.ndarray) -> np.ndarray:
+    """
+    通过解析延拓构造完整周期数据
+    从原数据的第二个点到倒数第二个点，取反后接到原数据末尾，
+    避免在延拓点处重复第一个点和最后一个点。
+    Args:
+        bn_data: 半周期磁密数据，最后一维为采样点（支持多个case堆叠的二维数组）
+    """
+    n_points = bn_data.shape[-1]  # 获取原序列采样点数
+    extension_data = -bn_data[..., 1:n_points-1]  # 从第二个点(索引1)到倒数第二个点，取反
+    return np.concatenate([bn_data, extension_data], axis=-1)
+
+
+def filter_harmonics(fft_result: np.ndarray, harmonic_filter_n: int) -> np.ndarray:
+    """
+    谐波滤波：保留0到harmonic_filter_n次谐波（沿最后一维）
+    """
+    n_points = fft_result.shape[-1]
+    fft_filtered = fft_result.copy()
+    if harmonic_filter_n < n_points // 2:
+        # 清除正频部分的高次谐波（保留0到harmonic_filter_n）
+        fft_filtered[..., harmonic_filter_n+1:n_points//2] = 0
+        # 清除负频部分的高次谐波（对称清除）
+        fft_filtered[..., n_points//2+1:n_points-harmonic_filter_n] = 0
+    return fft_filtered
+
+
+def filter_spectrum(fft_result: np.ndarray, harmonic_filter_n: int) -> tuple:
+    """
+    对已有频谱进行谐波滤波并反变换（沿最后一维）
+    Returns:
+        (滤波后的信号, 滤波后信号的最大绝对值)
+    """
+    filtered_signal = np.fft.ifft(filter_harmonics(fft_result, harmonic_filter_n), axis=-1).real
+    return filtered_signal, np.max(np.abs(filtered_signal), axis=-1)
+
+
+def compute_ksat(hm_dr, hm_ds, hm_delta, rotor_tooth_height=ROTOR_TOOTH_HEIGHT,
+                 stator_tooth_height=STATOR_TOOTH_HEIGHT, air_gap=AIR_GAP):
+    """
+    饱和系数 Ksat=1+(Hm_dr*h_r+Hm_ds*h_s)/(Hm_delta*δ)，默认h_r=23.6、h_s=27、δ=0.4（mm），
+    支持数组输入（各参数按numpy规则广播）
+    """
+    return 1 + (hm_dr * rotor_tooth_height + hm_ds * stator_tooth_height) / (hm_delta * air_gap)
+
+
+def compute_ksat_grid(hm_dr, hm_ds, hm_delta, rotor_tooth_heights=ROTOR_TOOTH_HEIGHT,
+                      stator_tooth_heights=STATOR_TOOTH_HEIGHT, air_gaps=AIR_GAP,
+                      outer: bool = False) -> np.ndarray:
+    """
+    对每个case和每组几何尺寸一次广播计算饱和系数
+    Args:
+        hm_dr, hm_ds, hm_delta: 各case的磁场强度，形状均为(case数,)
+        rotor_tooth_heights, stator_tooth_heights, air_gaps: 转子齿高、定子齿高、气隙长度（mm），标量或数组
+        outer: False时三个几何数组按numpy规则相互广播（逐组对应），结果形状为(case数,) + 广播后的形状；
+               True时取三者的所有组合，结果形状为(case数, 转子齿高数, 定子齿高数, 气隙长度数)
+    Returns:
+        Ksat数组，Hm_delta为0或任一磁场强度缺失（NaN）的case为NaN
+    """
+    geometry = [np.asarray(values, dtype=float) for values in
+                (rotor_tooth_heights, stator_tooth_heights, air_gaps)]
+    if outer:
+        geometry = [values.reshape([-1 if axis == i else 1 for axis in range(3)])
+                    for i, values in enumerate(geometry)]
+    rotor, stator, gap = np.broadcast_arrays(*geometry)
+    
+    # case放在第一维，几何尺寸放在其后各维
+    expand = (slice(None),) + (None,) * rotor.ndim
+    hm_dr, hm_ds, hm_delta = (np.asarray(values, dtype=float)[expand] for values in (hm_dr, hm_ds, hm_delta))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ksat = compute_ksat(hm_dr, hm_ds, hm_delta, rotor, stator, gap)
+    return np.where(hm_delta != 0, ksat, np.nan)
+
+
+def compute_flux_metrics(bn_full_cycle: np.ndarray, harmonic_filter_n: int,
+                         metrics: Optional[PipelineMetrics] = None) -> Dict[str, np.ndarray]:
+    """
+    计算完整周期磁密的特征值，沿最后一维向量化计算
+    一维输入对应单个case，二维输入(case数, 采样点数)对应批量case
+    Args:
+        metrics: 统计对象，不为None时记录fft、filter、reduction各阶段耗时
+    Returns:
+        包含b_av、b_delta1、spectrum、filtered_signal、b_delta、hm_delta的字典
+    """
+    lap = stage_timer(metrics)
+    n_points = bn_full_cycle.shape[-1]
+    
+    # 1. 计算完整周期的绝对值平均值
+    b_av = np.mean(np.abs(bn_full_cycle), axis=-1)
+    lap('reduction')
+    
+    # 2. FFT分析，基波幅值（第1次谐波）
+    fft_result = np.fft.fft(bn_full_cycle, axis=-1)
+    lap('fft')
+    b_delta1 = 2 * np.abs(fft_result[..., 1]) / n_points
+    
+    # 3. 谐波滤波后反变换得到滤波后的信号，取最大绝对值作为幅值（与filter_spectrum相同）
+    filtered_signal = np.fft.ifft(filter_harmonics(fft_result, harmonic_filter_n), axis=-1).real
+    lap('filter')
+    b_delta = np.max(np.abs(filtered_signal), axis=-1)
+    
+    # 4. 计算Hm_delta = 滤波后磁密最大值 / 真空磁导率
+    hm_delta = b_delta / MU_0
+    lap('reduction')
+    
+    return {
+        'b_av': b_av,
+        'b_delta1': b_delta1,
+        'spectrum': fft_result,
+        'filtered_signal': filtered_signal,
+        'b_delta': b_delta,
+        'hm_delta': hm_delta,
+    }
+
+
+@lru_cache(maxsize=32)
+def _half_wave_factors(half: int, harmonic_filter_n: int) -> tuple:
+    """
+    半波对称引擎中与case无关的系数（按半周期长度和滤波次数缓存）
+    Returns:
+        (正变换旋转因子, 反变换旋转因子, 奇次谐波保留掩码, 偶次谐波部分的核K, |K|, 保留的奇次谐波下标, 合成矩阵)，
+        正变换旋转因子已包含系数2，反变换旋转因子和核K已包含反变换的归一化系数M / 2M；
+        保留的奇次谐波不超过HALF_WAVE_DIRECT_MAX个时，合成矩阵形状为(2·保留个数, M)，第2j、2j+1行为
+        第j个保留谐波的cos、-sin（已除以2M），保留谐波（视为实数数组）与其相乘即得奇次谐波部分O；否则为None
+    """
+    twiddle = np.exp(-1j * np.pi * np.arange(half) / half)
+    keep = filter_harmonics(np.ones(2 * half), harmonic_filter_n)
+    even_kernel = 0.5 * np.fft.ifft(keep[0::2]).real
+    kept = np.flatnonzero(keep[1::2])
+    synthesis = None
+    if len(kept) <= HALF_WAVE_DIRECT_MAX:
+        phase = np.pi / half * np.outer(2 * kept + 1, np.arange(half))
+        synthesis = np.empty((2 * len(kept), half))
+        synthesis[0::2] = np.cos(phase) / (2 * half)
+        synthesis[1::2] = -np.sin(phase) / (2 * half)
+    factors = (2 * twiddle, 0.5 * np.conj(twiddle), keep[1::2].copy(), even_kernel, np.abs(even_kernel), kept,
+               synthesis)
+    for array in factors:
+        if array is not None:
+            array.flags.writeable = False
+    return factors
+
+
+def expand_half_wave_spectrum(half_spectrum: np.ndarray) -> np.ndarray:
+    """
+    由半波频谱（第0项为所有偶次谐波的公共值d，其后为M个奇次谐波）恢复长度2M的完整周期频谱（沿最后一维）
+    """
+    half = half_spectrum.shape[-1] - 1
+    spectrum = np.empty(half_spectrum.shape[:-1] + (2 * half,), dtype=complex)
+    spectrum[..., 0::2] = half_spectrum[..., :1]
+    spectrum[..., 1::2] = half_spectrum[..., 1:]
+    return spectrum
+
+
+def _half_wave_odd_part(half_spectrum: np.ndarray, harmonic_filter_n: int) -> np.ndarray:
+    """
+    滤波后信号的奇次谐波部分O（长度M）：保留的奇次谐波较少时由合成矩阵直接计算，否则由一次长度M的反变换得到
+    """
+    half = half_spectrum.shape[-1] - 1
+    _, inverse_twiddle, keep_odd, _, _, kept, synthesis = _half_wave_factors(half, harmonic_filter_n)
+    if synthesis is not None:
+        return np.ascontiguousarray(half_spectrum[..., kept + 1]).view(float) @ synthesis
+    odd_part = np.fft.ifft(half_spectrum[..., 1:] * keep_odd, axis=-1)
+    odd_part *= inverse_twiddle
+    return odd_part.real
+
+
+def filter_half_wave_spectrum(half_spectrum: np.ndarray, harmonic_filter_n: int) -> tuple:
+    """
+    对半波频谱进行谐波滤波，结果与filter_spectrum(expand_half_wave_spectrum(half_spectrum), harmonic_filter_n)相同
+    Returns:
+        (滤波后的完整周期信号, 其最大绝对值)
+    """
+    half = half_spectrum.shape[-1] - 1
+    even_kernel = _half_wave_factors(half, harmonic_filter_n)[3]
+    odd_part = _half_wave_odd_part(half_spectrum, harmonic_filter_n)
+    filtered_signal = np.empty(half_spectrum.shape[:-1] + (2 * half,))
+    np.multiply(half_spectrum[..., :1].real, even_kernel, out=filtered_signal[..., half:])
+    np.add(filtered_signal[..., half:], odd_part, out=filtered_signal[..., :half])
+    filtered_signal[..., half:] -= odd_part
+    return filtered_signal, np.max(np.abs(filtered_signal), axis=-1)
+
+
+def compute_flux_metrics_half_wave(bn_data: np.ndarray, harmonic_filter_n: int,
+                                   metrics: Optional[PipelineMetrics] = None) -> Dict[str, np.ndarray]:
+    """
+    半波对称引擎：直接由半周期数据计算与compute_flux_metrics(extend_half_cycle(bn_data))相同的特征值
+    记M = 采样点数 - 1，延拓后的完整周期x长度为2M，满足x[m+M] = -x[m] + d·δ[m]，其中d = b[0] + b[M]
+    为首尾点的对称误差。因此偶次谐波均等于d，奇次谐波X[2q+1] = 2·FFT_M(b[m]·e^(-iπm/M))[q] - d，
+    正变换只需一次长度为M的FFT；滤波后信号的奇次谐波部分O由一次长度M的反变换得到，
+    偶次谐波部分E = d·K（K为与case无关的固定核），前后半周期分别为(E + O)/2M和(E - O)/2M
+    （保留的奇次谐波较少时O由合成矩阵直接计算），
+    由max(|E + O|, |E - O|) = |E| + |O|，滤波后的最大绝对值为max(|d|·|K| + |O|)
+    只保存d和奇次谐波（半波频谱，长度M + 1），完整频谱和滤波后的信号在访问时再构造
+    Returns:
+        包含b_av、b_delta1、half_spectrum、b_delta、hm_delta的字典（spectrum、filtered_signal为None）
+    """
+    lap = stage_timer(metrics)
+    n_points = bn_data.shape[-1]
+    half = n_points - 1
+    n_full = 2 * half
+    d = bn_data[..., 0] + bn_data[..., half]
+    
+    # 1. 完整周期的绝对值平均值：中间点在延拓中出现两次，首尾点各出现一次
+    abs_b = np.abs(bn_data)
+    b_av = (abs_b[..., 0] + abs_b[..., half] + 2 * np.sum(abs_b[..., 1:half], axis=-1)) / n_full
+    lap('reduction')
+    
+    # 2. 奇次谐波由预乘旋转因子的长度M FFT得到，与偶次谐波的公共值d一起保存为半波频谱
+    twiddle, _, _, _, abs_even_kernel, _, _ = _half_wave_factors(half, harmonic_filter_n)
+    odd = np.fft.fft(bn_data[..., :half] * twiddle, axis=-1)
+    half_spectrum = np.empty(bn_data.shape[:-1] + (half + 1,), dtype=complex)
+    half_spectrum[..., 0] = d
+    np.subtract(odd, d[..., None], out=half_spectrum[..., 1:])
+    b_delta1 = 2 * np.abs(half_spectrum[..., 1]) / n_full
+    lap('fft')
+    
+    # 3. 谐波滤波：保留的谐波位置与完整频谱滤波一致，只需奇次谐波部分O
+    peak = np.abs(_half_wave_odd_part(half_spectrum, harmonic_filter_n))
+    lap('filter')
+    peak += np.abs(d)[..., None] * abs_even_kernel
+    b_delta = np.max(peak, axis=-1)
+    
+    # 4. 计算Hm_delta = 滤波后磁密最大值 / 真空磁导率
+    hm_delta = b_delta / MU_0
+    lap('reduction')
+    
+    return {
+        'b_av': b_av,
+        'b_delta1': b_delta1,
+        'spectrum': None,
+        'half_spectrum': half_spectrum,
+        'filtered_signal': None,
+        'b_delta': b_delta,
+        'hm_delta': hm_delta,
+    }
+
+
+@lru_cache(maxsize=32)
+def _sparse_factors(half: int, n_odd: int) -> tuple:
+    """
+    sparse引擎与case无关的系数（按半周期长度缓存）
+    Returns:
+        (DFT矩阵, 平均值权重)：DFT矩阵形状为(M+1, 2·n_odd+2)，半周期数据与其相乘的结果视为复数数组即为
+        [d, X_1, X_3, ...]（第0列求d = b[0] + b[M]，其后依次为第2j+1次谐波X = 2·Σ b[m]·e^(-iπkm/M) - d（m < M）的实部、虚部系数）；
+        半周期数据的绝对值与平均值权重[1, 2, ..., 2, 1]/N的点积为完整周期的绝对值平均值
+    """
+    phase = np.pi / half * np.outer(np.arange(half + 1), 2 * np.arange(n_odd) + 1)
+    matrix = np.zeros((half + 1, 2 * n_odd + 2))
+    matrix[:, 2::2] = 2 * np.cos(phase)
+    matrix[:, 3::2] = -2 * np.sin(phase)
+    matrix[half] = 0
+    matrix[[0, half], 0] = 1
+    matrix[[0, half], 2::2] -= 1
+    mean_weights = np.full(half + 1, 1.0 / half)
+    mean_weights[[0, half]] /= 2
+    for array in (matrix, mean_weights):
+        array.flags.writeable = False
+    return matrix, mean_weights
+
+
+def sparse_harmonic_count(half: int, harmonic_filter_n: int) -> int:
+    """sparse引擎保留的谐波个数（第0到n次，不超过Nyquist频率以下的最高次）"""
+    return min(max(harmonic_filter_n, 0), half - 1) + 1
+
+
+def synthesize_harmonics(harmonics: np.ndarray, n_points: int) -> np.ndarray:
+    """
+    由保留的谐波系数（第0到K次的DFT系数）合成n_points点的滤波后波形（沿最后一维）
+    与对完整频谱滤波后反变换的结果一致（不含Nyquist频率分量）
+    """
+    n_harmonics = min(harmonics.shape[-1], n_points // 2)
+    padded = np.zeros(harmonics.shape[:-1] + (n_points // 2 + 1,), dtype=complex)
+    padded[..., :n_harmonics] = harmonics[..., :n_harmonics]
+    return np.fft.irfft(padded, n_points, axis=-1)
+
+
+@lru_cache(maxsize=32)
+def _harmonic_peak_factors(n_harmonics: int) -> tuple:
+    """
+    harmonic_peak中与case无关的系数（k = 0..K-1为谐波次数）
+    Returns:
+        (相位系数ik, 导数系数, 曲率界, 粗搜索网格点数, 网格表下标, 粗搜索网格表)：
+        谐波系数X_k乘以导数系数[s_k, ik·s_k, -k²·s_k, -ik³·s_k]后与e^(ikθ)相乘，实部依次为N·f、N·f'、N·f''、N·f'''；
+        |X_k|与曲率界相乘为网格值与真实峰值之差的上界（N·|f''|上界·(网格间距/2)²/2）；
+        半波对称时偶次谐波均等于X_0，按网格表下标取出[X_0, X_1, X_3, ...]视为实数数组后与网格表相乘即得N·f在网格上的值
+        （偶次谐波合并为一组，网格表的行数约为谐波数，与半波对称引擎只保存奇次谐波相同），
+        谐波数超过SPARSE_TABLE_MAX时网格表为None（改用irfft计算）
+    """
+    orders = np.arange(n_harmonics, dtype=float)
+    # f(θ) = Re Σ c_k·e^(ikθ)，c_0 = X_0/N，c_k = 2X_k/N
+    scale = np.where(orders == 0, 1.0, 2.0)
+    derivative_factors = np.stack([scale, 1j * orders * scale, -orders ** 2 * scale, -1j * orders ** 3 * scale])
+    n_grid = max(16, SPARSE_GRID_FACTOR * n_harmonics)
+    n_grid += n_grid % 2
+    curvature_bound = scale * orders ** 2 * (2 * np.pi / n_grid) ** 2 / 8
+    table_index = np.r_[0, 1:n_harmonics:2]
+    grid_table = None
+    if n_harmonics <= SPARSE_TABLE_MAX:
+        grid_phase = np.outer(orders, 2 * np.pi / n_grid * np.arange(n_grid))
+        cos_table = scale[:, None] * np.cos(grid_phase)
+        sin_table = -scale[:, None] * np.sin(grid_phase)
+        grid_table = np.empty((2 * len(table_index), n_grid))
+        grid_table[0] = cos_table[0::2].sum(axis=0)
+        grid_table[1] = sin_table[0::2].sum(axis=0)
+        grid_table[2::2] = cos_table[1::2]
+        grid_table[3::2] = sin_table[1::2]
+    factors = (1j * orders, derivative_factors, curvature_bound, n_grid, table_index, grid_table)
+    for array in factors:
+        if isinstance(array, np.ndarray):
+            array.flags.writeable = False
+    return factors
+
+
+def harmonic_peak(harmonics: np.ndarray, n_full: int) -> np.ndarray:
+    """
+    由谐波系数求滤波后连续波形的最大绝对值（沿最后一维）
+    先在每次谐波SPARSE_GRID_FACTOR个点的均匀网格上粗搜索，再以Halley迭代求导数零点精确定位峰值，
+    结果不受原始采样点疏密的影响。网格值与真实峰值之差不超过|f''|上界·(网格间距/2)²/2，
+    在此范围内的网格局部极大值都进行迭代（半波对称波形的正负峰高度相近，通常为两个）；
+    单个case（一维输入）与批量计算的迭代公式相同，只是候选点很少，步长按标量计算以减少小数组运算的开销。
+    数据含NaN时没有候选点，结果为NaN
+    Args:
+        harmonics: 第0到K次谐波的DFT系数（与完整周期FFT的归一化一致，来自半波对称数据，偶次谐波均相等）
+        n_full: 完整周期的采样点数
+    """
+    (phase_orders, derivative_factors, curvature_bound,
+     n_grid, table_index, grid_table) = _harmonic_peak_factors(harmonics.shape[-1])
+    step_limit = 2 * np.pi / n_grid
+    harmonics = np.ascontiguousarray(harmonics, dtype=complex)
+    
+    # 1. 粗搜索：在均匀网格上求N·f（d与奇次谐波与余弦表相乘，谐波较多时用irfft），找出可能包含最高峰的网格局部极大值
+    if grid_table is not None:
+        grid_values = harmonics.take(table_index, axis=-1).view(float) @ grid_table
+    else:
+        grid_values = np.fft.irfft(harmonics, n_grid, axis=-1, norm='forward')
+    # 绝对值就地计算（网格值的符号由迭代第一次计算的f得到），减少大数组的临时分配
+    magnitude = np.abs(grid_values, out=grid_values)
+    grid_peak = magnitude.max(axis=-1)
+    threshold = grid_peak - np.abs(harmonics) @ curvature_bound
+    
+    # 2. Halley迭代求f'(θ) = 0（步长s = -2f'f''/(2f''² - f'f''')），步长限制在一个网格间距内，二阶导数符号不对时不移动；
+    #    f到f'''由一次复指数计算和一次矩阵乘法同时得到，
+    #    最后一次不再移动，由三次模型f + f'·s + f''·s²/2 + f'''·s³/6（s为限制后的步长）给出峰值
+    if harmonics.ndim == 1:
+        candidates = [j for j in np.flatnonzero(magnitude >= threshold).tolist()
+                      if magnitude[j] >= magnitude[j - 1] and magnitude[j] >= magnitude[(j + 1) % n_grid]]
+        if not candidates:
+            return grid_peak / n_full
+        derivative_matrix = harmonics * derivative_factors
+        theta = [step_limit * j for j in candidates]
+        for i in range(SPARSE_REFINE_STEPS + 1):
+            trig = np.exp(np.multiply.outer(theta, phase_orders))
+            values, firsts, seconds, thirds = (derivative_matrix @ trig.T).real.tolist()
+            if i == 0:
+                signs = [-1.0 if value < 0 else 1.0 for value in values]
+            steps = [min(max(-2 * first * second / (2 * second * second - first * third), -step_limit), step_limit)
+                     if second * sign < 0 else 0.0
+                     for first, second, third, sign in zip(firsts, seconds, thirds, signs)]
+            if i == SPARSE_REFINE_STEPS:
+                break
+            theta = [t + step for t, step in zip(theta, steps)]
+        peaks = [abs(value + step * (first + step * (second / 2 + third * step / 6)))
+                 for value, first, second, third, step in zip(values, firsts, seconds, thirds, steps)]
+        # 迭代结果不应小于粗搜索结果
+        return np.float64(max(float(grid_peak), *peaks) / n_full)
+    
+    # 先按阈值筛选（每个case通常只有几个网格点），再判断是否为局部极大值（网格首尾相接）
+    above = np.flatnonzero(magnitude >= threshold[..., None])
+    magnitude = magnitude.reshape(-1)
+    rows, columns = np.divmod(above, n_grid)
+    is_peak = ((magnitude[above] >= magnitude[rows * n_grid + (columns - 1) % n_grid])
+               & (magnitude[above] >= magnitude[rows * n_grid + (columns + 1) % n_grid]))
+    rows, columns = rows[is_peak], columns[is_peak]
+    matrices = harmonics.reshape(-1, harmonics.shape[-1])[rows][:, None, :] * derivative_factors
+    theta = step_limit * columns
+    for i in range(SPARSE_REFINE_STEPS + 1):
+        trig = np.exp(np.multiply.outer(theta, phase_orders))
+        value, first, second, third = (matrices @ trig[..., None])[..., 0].real.T
+        if i == 0:
+            sign = np.where(value < 0, -1.0, 1.0)
+        step = np.divide(-2 * first * second, 2 * second * second - first * third,
+                         out=np.zeros_like(first), where=second * sign < 0)
+        step = np.clip(step, -step_limit, step_limit)
+        if i == SPARSE_REFINE_STEPS:
+            break
+        theta = theta + step
+    
+    # 迭代结果不应小于粗搜索结果（没有候选点的case保持粗搜索结果，含NaN时即为NaN）
+    peak = grid_peak.reshape(-1).copy()
+    np.maximum.at(peak, rows, np.abs(value + step * (first + step * (second / 2 + third * step / 6))))
+    return peak.reshape(grid_peak.shape) / n_full
+
+
+def compute_flux_metrics_sparse(bn_data: np.ndarray, harmonic_filter_n: int,
+                                metrics: Optional[PipelineMetrics] = None) -> Dict[str, np.ndarray]:
+    """
+    sparse引擎：只计算第0到harmonic_filter_n次谐波系数（半波对称，偶次谐波均为d = b[0] + b[M]，
+    d与奇次谐波由一次DFT矩阵乘法直接计算），滤波后波形的峰值由harmonic_peak在连续波形上求解
+    不计算完整频谱，滤波后的信号在访问时由谐波系数合成；不含Nyquist频率分量，
+    b_delta与full引擎在采样网格上取最大值的结果略有差异
+    Returns:
+        包含b_av、b_delta1、harmonics、b_delta、hm_delta的字典（spectrum、filtered_signal为None）
+    """
+    lap = stage_timer(metrics)
+    n_points = bn_data.shape[-1]
+    half = n_points - 1
+    if half < 1:
+        raise ValueError(f"采样点数不足: {n_points}")
+    n_full = 2 * half
+    
+    # 保留的谐波：不超过Nyquist频率，基波总是计算（用于b_delta1）
+    n_harmonics = sparse_harmonic_count(half, harmonic_filter_n)
+    n_odd = max(n_harmonics, 2) // 2
+    dft_matrix, mean_weights = _sparse_factors(half, n_odd)
+    
+    # 1. 完整周期的绝对值平均值
+    b_av = np.abs(bn_data) @ mean_weights
+    lap('reduction')
+    
+    # 2. 保留的谐波系数：一次矩阵乘法得到[d, X_1, X_3, ...]，偶次谐波均为d
+    half_spectrum = (bn_data @ dft_matrix).view(complex)
+    harmonics = np.empty(bn_data.shape[:-1] + (max(n_harmonics, 2),), dtype=complex)
+    harmonics[..., 0::2] = half_spectrum[..., :1]
+    harmonics[..., 1::2] = half_spectrum[..., 1:]
+    b_delta1 = np.abs(half_spectrum[..., 1]) * (2 / n_full)
+    harmonics = harmonics[..., :n_harmonics]
+    lap('fft')
+    
+    # 3. 滤波后连续波形的峰值
+    b_delta = harmonic_peak(harmonics, n_full)
+    
+    # 4. 计算Hm_delta = 滤波后磁密最大值 / 真空磁导率
+    hm_delta = b_delta / MU_0
+    lap('reduction')
+    
+    return {
+        'b_av': b_av,
+        'b_delta1': b_delta1,
+        'spectrum': None,
+        'harmonics': harmonics,
+        'filtered_signal': None,
+        'b_delta': b_delta,
+        'hm_delta': hm_delta,
+    }
+
+
+def compute_half_cycle_metrics(bn_data: np.ndarray, harmonic_filter_n: int, engine: str = 'full',
+                               metrics: Optional[PipelineMetrics] = None) -> tuple:
+    """
+    由半周期数据计算特征值（沿最后一维），按engine选择计算方式
+    Args:
+        metrics: 统计对象，不为None时记录extension及各计算阶段的耗时
+    Returns:
+        (特征值字典, 完整周期数据)；half_wave、sparse引擎不构造完整周期数据，此时第二项为None
+    """
+    if engine == 'full':
+        lap = stage_timer(metrics)
+        bn_full_cycle = extend_half_cycle(bn_data)
+        lap('extension')
+        return compute_flux_metrics(bn_full_cycle, harmonic_filter_n, metrics), bn_full_cycle
+    if engine == 'half_wave':
+        return compute_flux_metrics_half_wave(bn_data, harmonic_filter_n, metrics), None
+    if engine == 'sparse':
+        return compute_flux_metrics_sparse(bn_data, harmonic_filter_n, metrics), None
+    raise ValueError(f"未知的计算引擎: {engine}")
+
+
+def _get_bn_values(case_data: 'CaseData') -> Optional[np.ndarray]:
+    """获取case的Bn序列，数据缺失时返回None"""
+    if case_data.flux_columns is None or 'Bn' not in case_data.flux_columns:
+        return None
+    return case_data.flux_columns['Bn']
+
+
+def _owned_array(values: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """其他数组的视图复制为独立数组，内存映射上的视图保持不变"""
+    if values is None or values.base is None or isinstance(values, np.memmap):
+        return values
+    return values.copy()
+
+
+class _ResultField:
+    """CaseData的标量结果属性：绑定到ResultStore后直接读写存储中对应的行"""
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+    
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        if obj._store is not None:
+            return obj._store.get_value(self.name, obj._row)
+        return obj.__dict__.get(self.name)
+    
+    def __set__(self, obj, value):
+        if obj._store is not None:
+            obj._store.set_value(self.name, obj._row, value)
+        else:
+            obj.__dict__[self.name] = value
 
 
 class CaseData:
     """存储每个case数据的类"""
     
+    hm_delta = _ResultField()
+    hm_dr = _ResultField()
+    hm_ds = _ResultField()
+    ksat = _ResultField()
+    b_av = _ResultField()
+    b_delta1 = _ResultField()
+    b_delta = _ResultField()
+    alpha_i = _ResultField()
+    k_nm = _ResultField()
+    k_w = _ResultField()
+    
     def __init__(self, case_id: str):
+        # 绑定的结果存储及行号，未绑定时标量结果保存在实例自身
+        self._store: Optional[ResultStore] = None
+        self._row: Optional[int] = None
+        # 波形缓存、波形被释放后的重新加载函数，以及波形当前是否已被缓存释放
+        self._waveform_cache: Optional[WaveformCache] = None
+        self._reload: Optional[Callable[['CaseData'], None]] = None
+        self._evicted = False
+        
         self.case_id = case_id
         self.hm_delta: Optional[float] = None
         self.hm_dr: Optional[float] = None
         self.hm_ds: Optional[float] = None
-        self.airgap_flux_data: Optional[pd.DataFrame] = None
+        # 气隙磁密数据，以列名到numpy数组的字典保存，需要时再构造DataFrame
+        self._flux_columns: Optional[Dict[str, np.ndarray]] = None
+        self._airgap_flux_df: Optional['pd.DataFrame'] = None
         
         # 计算得出的数据
         self.ksat: Optional[float] = None  # 饱和系数
         self.b_av: Optional[float] = None  # 完整周期绝对值平均值
         self.b_delta1: Optional[float] = None  # FFT基波幅值
         self.b_delta: Optional[float] = None  # 滤波后幅值
-        self.full_cycle_flux: Optional[np.ndarray] = None  # 完整周期数据
-        self.filtered_signal: Optional[np.ndarray] = None  # 滤波后的信号
+        self._full_cycle_flux: Optional[np.ndarray] = None  # 完整周期数据
+        self._spectrum: Optional[np.ndarray] = None  # 完整周期FFT频谱
+        self._harmonics: Optional[np.ndarray] = None  # 保留的第0到n次谐波系数（sparse引擎）
+        self._half_spectrum: Optional[np.ndarray] = None  # 偶次谐波公共值d和奇次谐波（half_wave引擎）
+        self._filtered_signal: Optional[np.ndarray] = None  # 滤波后的信号
+        self.waveform_params: Optional[tuple] = None  # 计算波形使用的(谐波滤波次数, 计算引擎)
         self.alpha_i: Optional[float] = None  # alpha_i = B_av/B_delta
         self.k_nm: Optional[float] = None  # K_Nm = 1/sqrt(2) * (B_delta1/B_av)
         self.k_w: Optional[float] = None  # K_W = B_delta/B_delta1
         
+    def bind(self, store: ResultStore, row: int):
+        """绑定到结果存储的指定行，此后标量结果只保存在存储中"""
+        for field in RESULT_FIELDS:
+            self.__dict__.pop(field, None)
+        self._store = store
+        self._row = row
+    
+    def release_waveforms(self):
+        """释放气隙磁密、延拓、频谱和滤波后的波形数据，只保留标量结果"""
+        self.flux_columns = None
+        self._airgap_flux_df = None
+        self.full_cycle_flux = None
+        self.spectrum = None
+        self.harmonics = None
+        self.half_spectrum = None
+        self.filtered_signal = None
+    
+    def attach_waveform_cache(self, cache: WaveformCache, reload: Callable[['CaseData'], None]):
+        """
+        由波形缓存管理该case的波形数据
+        Args:
+            cache: 波形缓存
+            reload: 波形被释放后再次访问时调用的重新加载函数，参数为该CaseData
+        """
+        self._waveform_cache = cache
+        self._reload = reload
+        # 批量计算得到的波形是整批数组的视图，复制后才能在释放时真正回收整批数组（内存映射的数据除外）
+        for name in ('_full_cycle_flux', '_spectrum', '_harmonics', '_half_spectrum', '_filtered_signal'):
+            setattr(self, name, _owned_array(getattr(self, name)))
+        if self._flux_columns is not None and self._airgap_flux_df is None:
+            self._flux_columns = {name: _owned_array(values) for name, values in self._flux_columns.items()}
+        cache.touch(self)
+    
+    def detach_waveform_cache(self):
+        """不再由波形缓存管理"""
+        if self._waveform_cache is not None:
+            self._waveform_cache.discard(self)
+        self._waveform_cache = None
+        self._reload = None
+        self._evicted = False
+    
+    def evict_waveforms(self):
+        """由波形缓存调用：释放波形数据，再次访问时重新加载"""
+        self.release_waveforms()
+        self._evicted = True
+    
+    def waveform_nbytes(self) -> int:
+        """当前保存在内存中的波形数据字节数（内存映射的数据不计入，DataFrame按与各列相同的大小估算）"""
+        nbytes = 0
+        for values in (self._full_cycle_flux, self._spectrum, self._harmonics, self._half_spectrum,
+                       self._filtered_signal):
+            if values is not None and not isinstance(values, np.memmap):
+                nbytes += values.nbytes
+        if self._flux_columns is not None:
+            columns_nbytes = sum(values.nbytes for values in self._flux_columns.values()
+                                 if not isinstance(values, np.memmap))
+            nbytes += columns_nbytes if self._airgap_flux_df is None else 2 * columns_nbytes
+        return nbytes
+    
+    def _access_waveforms(self):
+        """访问波形数据前调用：已被波形缓存释放时重新加载，并更新缓存的访问顺序"""
+        if self._waveform_cache is not None:
+            if self._evicted:
+                self._evicted = False
+                if self._reload is not None:
+                    self._reload(self)
+                    self._waveform_cache.reloads += 1
+            self._waveform_cache.touch(self)
+    
+    @property
+    def flux_columns(self) -> Optional[Dict[str, np.ndarray]]:
+        """气隙磁密数据，以列名到numpy数组的字典保存，需要时再构造DataFrame"""
+        self._access_waveforms()
+        return self._flux_columns
+    
+    @flux_columns.setter
+    def flux_columns(self, value: Optional[Dict[str, np.ndarray]]):
+        self._flux_columns = value
+    
+    @property
+    def spectrum(self) -> Optional[np.ndarray]:
+        """完整周期FFT频谱，half_wave引擎只保存半波频谱，首次访问时恢复完整频谱"""
+        self._access_waveforms()
+        if self._spectrum is None and self._half_spectrum is not None:
+            self._spectrum = expand_half_wave_spectrum(self._half_spectrum)
+        return self._spectrum
+    
+    @spectrum.setter
+    def spectrum(self, value: Optional[np.ndarray]):
+        self._spectrum = value
+    
+    @property
+    def harmonics(self) -> Optional[np.ndarray]:
+        """保留的第0到n次谐波系数（sparse引擎）"""
+        self._access_waveforms()
+        return self._harmonics
+    
+    @harmonics.setter
+    def harmonics(self, value: Optional[np.ndarray]):
+        self._harmonics = value
+    
+    @property
+    def half_spectrum(self) -> Optional[np.ndarray]:
+        """偶次谐波的公共值d和M个奇次谐波（half_wave引擎）"""
+        self._access_waveforms()
+        return self._half_spectrum
+    
+    @half_spectrum.setter
+    def half_spectrum(self, value: Optional[np.ndarray]):
+        self._half_spectrum = value
+    
+    @property
+    def full_cycle_flux(self) -> Optional[np.ndarray]:
+        """完整周期数据，计算时未构造（如half_wave、sparse引擎）则在首次访问时由半周期数据延拓得到"""
+        self._access_waveforms()
+        if self._full_cycle_flux is None and any(values is not None for values in
+                                                 (self._spectrum, self._harmonics, self._half_spectrum)):
+            bn_data = _get_bn_values(self)
+            if bn_data is not None:
+                self._full_cycle_flux = extend_half_cycle(bn_data)
+        return self._full_cycle_flux
+    
+    @full_cycle_flux.setter
+    def full_cycle_flux(self, value: Optional[np.ndarray]):
+        self._full_cycle_flux = value
+    
+    @property
+    def filtered_signal(self) -> Optional[np.ndarray]:
+        """
+        滤波后的信号，sparse引擎只保存谐波系数、half_wave引擎只保存半波频谱，首次访问时合成完整周期的波形
+        """
+        self._access_waveforms()
+        if self._filtered_signal is None and self._harmonics is not None:
+            bn_data = _get_bn_values(self)
+            if bn_data is not None:
+                self._filtered_signal = synthesize_harmonics(self._harmonics, 2 * (len(bn_data) - 1))
+        elif self._filtered_signal is None and self._half_spectrum is not None and self.waveform_params is not None:
+            self._filtered_signal = filter_half_wave_spectrum(self._half_spectrum, self.waveform_params[0])[0]
+        return self._filtered_signal
+    
+    @filtered_signal.setter
+    def filtered_signal(self, value: Optional[np.ndarray]):
+        self._filtered_signal = value
+    
+    @property
+    def airgap_flux_data(self) -> Optional['pd.DataFrame']:
+        """气隙磁密数据的DataFrame形式，首次访问时由flux_columns构造"""
+        self._access_waveforms()
+        if self._airgap_flux_df is None and self.flux_columns is not None:
+            import pandas as pd
+            self._airgap_flux_df = pd.DataFrame(self.flux_columns, copy=False)
+        return self._airgap_flux_df
+    
+    @airgap_flux_data.setter
+    def airgap_flux_data(self, df: Optional['pd.DataFrame']):
+        self._airgap_flux_df = df
+        self.flux_columns = None if df is None else {col: df[col].values for col in df.columns}
+    
     def calculate_ksat(self):
-        """计算饱和系数 Ksat=1+(Hm_dr*23.6+Hm_ds*27)/(Hm_delta*0.4)"""
+        """计算饱和系数 Ksat=1+(Hm_dr*23.6+Hm_ds*27)/(Hm_delta*0.4)，几何尺寸为默认值，其他尺寸见DataProcessor.ksat_grid"""
         if all(v is not None for v in [self.hm_delta, self.hm_dr, self.hm_ds]):
             if self.hm_delta != 0:
-                self.ksat = 1 + (self.hm_dr * 23.6 + self.hm_ds * 27) / (self.hm_delta * 0.4)
+                self.ksat = compute_ksat(self.hm_dr, self.hm_ds, self.hm_delta)
             else:
                 self.ksat = None
         else:
@@ -57,74 +793,96 @@ class CaseData:
         else:
             self.k_w = None
     
-    def process_airgap_flux(self, harmonic_filter_n: int = 50):
+    def process_airgap_flux(self, harmonic_filter_n: int = 50, engine: str = 'full',
+                            metrics: Optional[PipelineMetrics] = None):
         """
         处理气隙磁密数据，并计算Hm_delta
         Args:
             harmonic_filter_n: 谐波滤波次数，保留小于n次的谐波
+            engine: 计算引擎，见FLUX_ENGINES
+            metrics: 统计对象，不为None时记录各计算阶段的耗时和失败原因
         """
-        if self.airgap_flux_data is None:
+        if self.flux_columns is None:
             return
         
         try:
-            # 真空磁导率 μ₀ = 4π × 10⁻⁷ H/m
-            mu_0 = 4 * np.pi * 1e-7
-            
             # 提取磁密数据（保留完整原始序列）
-            bn_data = self.airgap_flux_data['Bn'].values  # 保留所有数据点
-            
-            # 构造完整周期数据（通过解析延拓）
-            # 从原数据的第二行到倒数第二行，取反后接到原数据末尾
-            # 避免在延拓点处重复第一个点和最后一个点
-            n_points = len(bn_data)  # 获取原序列采样点数
-            extension_data = -bn_data[1:n_points-1]  # 从第二行(索引1)到倒数第二行，取反
-            bn_full_cycle = np.concatenate([bn_data, extension_data])
+            bn_data = self.flux_columns['Bn']  # 保留所有数据点
             
+            # 构造完整周期数据（通过解析延拓），FFT分析、谐波滤波及特征值计算
+            results, bn_full_cycle = compute_half_cycle_metrics(bn_data, harmonic_filter_n, engine, metrics)
+            self.waveform_params = (harmonic_filter_n, engine)
             self.full_cycle_flux = bn_full_cycle
-            
-            # 1. 计算完整周期的绝对值平均值
-            self.b_av = np.mean(np.abs(bn_full_cycle))
-            
-            # 2. FFT分析
-            fft_result = np.fft.fft(bn_full_cycle)
-            n_points = len(bn_full_cycle)
-            
-            # 基波幅值（第1次谐波）
-            self.b_delta1 = 2 * np.abs(fft_result[1]) / n_points
-            
-            # 3. 谐波滤波：保留0到n次谐波
-            fft_filtered = fft_result.copy()
-            # 清除高次谐波，保留0到harmonic_filter_n次谐波
-            if harmonic_filter_n < n_points // 2:
-                # 清除正频部分的高次谐波（保留0到harmonic_filter_n）
-                fft_filtered[harmonic_filter_n+1:n_points//2] = 0
-                # 清除负频部分的高次谐波（对称清除）
-                fft_filtered[n_points//2+1:n_points-harmonic_filter_n] = 0
-            
-            # 反变换得到滤波后的信号
-            filtered_signal = np.fft.ifft(fft_filtered).real
-            self.filtered_signal = filtered_signal  # 保存滤波后的信号
-            
-            # 计算滤波后的幅值（可以用RMS值或最大值）
-            self.b_delta = np.max(np.abs(filtered_signal))  # 取滤波后信号的最大绝对值作为幅值
-            
-            # 4. 计算Hm_delta = 滤波后磁密最大值 / 真空磁导率
-            b_max_filtered = np.max(np.abs(filtered_signal))
-            self.hm_delta = b_max_filtered / mu_0
+            self.b_av = results['b_av']
+            self.b_delta1 = results['b_delta1']
+            self.spectrum = results['spectrum']
+            self.harmonics = results.get('harmonics')
+            self.half_spectrum = results.get('half_spectrum')
+            self.filtered_signal = results['filtered_signal']  # 保存滤波后的信号
+            self.b_delta = results['b_delta']
+            self.hm_delta = results['hm_delta']
             
         except Exception as e:
+            if metrics is not None:
+                metrics.record_failure('flux_processing', f"case {self.case_id}", e)
             self.b_av = None
             self.b_delta1 = None
             self.b_delta = None
             self.full_cycle_flux = None
+            self.spectrum = None
+            self.harmonics = None
+            self.half_spectrum = None
             self.filtered_signal = None
             self.hm_delta = None
             self.alpha_i = None
             self.k_nm = None
             self.k_w = None
     
+    @classmethod
+    def from_cache_entry(cls, entry: Dict, harmonic_filter_n: int) -> 'CaseData':
+        """由磁盘缓存记录重建CaseData，波形数据由缓存的频谱恢复"""
+        case_data = cls(entry['case_id'])
+        for field in ('hm_dr', 'hm_ds', 'hm_delta', 'ksat', 'b_av', 'b_delta1',
+                      'b_delta', 'alpha_i', 'k_nm', 'k_w'):
+            setattr(case_data, field, entry[field])
+        
+        if entry['columns'] is not None:
+            case_data.flux_columns = entry['columns']
+        if entry['spectrum'] is not None:
+            case_data.spectrum = entry['spectrum']
+            case_data.filtered_signal = filter_spectrum(entry['spectrum'], harmonic_filter_n)[0]
+        case_data.harmonics = entry.get('harmonics')
+        case_data.half_spectrum = entry.get('half_spectrum')
+        return case_data
+    
+    def __getstate__(self):
+        """序列化时只保留气隙磁密的numpy数组，不传输DataFrame，减少进程间传输开销"""
+        state = self.__dict__.copy()
+        state['_airgap_flux_df'] = None
+        # 完整周期数据可由半周期数据重新延拓得到，不随对象传输
+        if self._flux_columns is not None and (self._spectrum is not None or self._half_spectrum is not None):
+            state['_full_cycle_flux'] = None
+        # 滤波后的信号可由谐波系数重新合成，完整频谱可由半波频谱恢复
+        if self._flux_columns is not None and self._harmonics is not None:
+            state['_filtered_signal'] = None
+        if self._half_spectrum is not None:
+            state['_spectrum'] = None
+            if self.waveform_params is not None:
+                state['_filtered_signal'] = None
+        # 波形缓存只在所属进程中有效
+        state['_waveform_cache'] = None
+        state['_reload'] = None
+        state['_evicted'] = False
+        # 已绑定结果存储时，将标量结果取出随对象一起序列化
+        state['_store'] = None
+        state['_row'] = None
+        for field in RESULT_FIELDS:
+            state[field] = getattr(self, field)
+        return state
+    
     def __str__(self):
-        flux_info = f"airgap_flux_rows={len(self.airgap_flux_data) if self.airgap_flux_data is not None else 0}"
+        n_rows = len(next(iter(self.flux_columns.values()))) if self.flux_columns else 0
+        flux_info = f"airgap_flux_rows={n_rows}"
         ksat_info = f"Ksat={self.ksat:.4f}" if self.ksat is not None else "Ksat=None"
         return f"Case {self.case_id}: Hm_delta={self.hm_delta}, Hm_dr={self.hm_dr}, Hm_ds={self.hm_ds}, {ksat_info}, {flux_info}"
     
@@ -135,12 +893,48 @@ class CaseData:
 class DataProcessor:
     """处理prmtric.1目录中所有case数据的主类"""
     
-    def __init__(self, base_dir: str = "prmtric.1"):
+    def __init__(self, base_dir: str = "prmtric.1", cache: Optional[CaseCache] = None,
+                 fast_ingest: bool = False, engine: str = 'full', lazy: bool = False,
+                 harmonic_filter_n: int = 50, metrics: Optional[PipelineMetrics] = None,
+                 shard: Optional[Tuple[int, int]] = None, waveform_cache: Optional[WaveformCache] = None):
+        """
+        Args:
+            base_dir: 参数扫描目录，或由packed_sweep.pack_sweep生成的打包文件（以内存映射方式打开）
+            cache: 磁盘缓存，设置后只重新计算新增或发生变化的case
+            fast_ingest: 是否不经过pandas直接将airgapflux.csv读取为numpy数组
+            engine: 气隙磁密特征值的计算引擎，见FLUX_ENGINES
+            lazy: 延迟加载模式，get_case_data首次访问某个case时才读取和处理该case，
+                  get_all_cases、get_case_summary等汇总操作在首次调用时批量处理全部case
+            harmonic_filter_n: 延迟加载模式下按需处理使用的谐波滤波次数
+            metrics: 分阶段计时和错误统计对象（见pipeline_metrics），None时不统计
+            shard: (分片序号i, 分片数N)，只处理按(扫描目录名, case编号)哈希分配到第i片的case（见sharding），
+                   None时处理全部case
+            waveform_cache: 波形缓存，设置后只在内存中保留最近访问的case的波形数据（不超过其内存上限），
+                            被释放的波形在再次访问时重新读取并计算；None时保留所有case的波形
+        """
+        if engine not in FLUX_ENGINES:
+            raise ValueError(f"未知的计算引擎: {engine}")
         self.base_dir = base_dir
+        self.cache = cache
+        self.fast_ingest = fast_ingest
+        self.engine = engine
+        self.lazy = lazy
+        self.harmonic_filter_n = harmonic_filter_n
         self.cases: Dict[str, CaseData] = {}
+        self.results = ResultStore()  # 所有case标量结果的列式存储
+        self.packed: Optional[PackedSweep] = PackedSweep(base_dir) if os.path.isfile(base_dir) else None
+        self._case_index: Optional[Dict[str, object]] = None  # case编号 -> case目录（打包文件中为序号）
+        self._all_processed = False  # 是否已处理全部case（延迟加载模式）
+        self.metrics = metrics
+        self.shard = shard
+        self.waveform_cache = waveform_cache
+        self.sweep_name = sweep_name(base_dir)
         
     def get_case_directories(self) -> List[str]:
         """获取所有case目录"""
+        if self.packed is not None:
+            return []
+        lap = stage_timer(self.metrics)
         case_pattern = os.path.join(self.base_dir, "case.*")
         case_dirs = glob.glob(case_pattern)
         # 提取case编号并排序
@@ -156,40 +950,130 @@ class DataProcessor:
         
         # 按case编号排序
         case_nums.sort(key=lambda x: x[0])
-        return [case_dir for _, case_dir in case_nums]
+        lap('discover')
+        return [case_dir for case_num, case_dir in case_nums if self.in_shard(case_num)]
+    
+    def in_shard(self, case_id) -> bool:
+        """case是否属于本处理器的分片（未分片时总是True）"""
+        return self.shard is None or shard_of(self.sweep_name, case_id, self.shard[1]) == self.shard[0]
+    
+    def case_index(self) -> Dict[str, object]:
+        """
+        case编号到case目录（打包文件中为case序号）的索引，首次调用时建立，之后直接复用
+        """
+        if self._case_index is None:
+            if self.packed is not None:
+                case_ids = self.packed.index['case_id']
+                self._case_index = {str(case_id): i for i, case_id in enumerate(case_ids.tolist())
+                                    if self.in_shard(case_id)}
+            else:
+                self._case_index = {os.path.basename(case_dir).split(".")[1]: case_dir
+                                    for case_dir in self.get_case_directories()}
+        return self._case_index
+    
+    def locate_case(self, case_id: str):
+        """查找case所在的目录（打包文件中为序号），不存在或不属于本分片时返回None"""
+        if not self.in_shard(case_id):
+            return None
+        if self.packed is None and self._case_index is None:
+            # case目录按"case.编号"命名，直接检查对应目录，无需扫描整个参数扫描目录
+            case_dir = os.path.join(self.base_dir, f"case.{case_id}")
+            if os.path.isdir(case_dir):
+                return case_dir
+        return self.case_index().get(case_id)
+    
+    def _load_case_on_demand(self, case_id: str) -> Optional[CaseData]:
+        """延迟加载模式下读取并处理单个case，结果加入self.cases"""
+        location = self.locate_case(case_id)
+        if location is None:
+            return None
+        
+        if self.packed is not None:
+            case_list = self.load_packed_cases(location, location + 1)
+            self.process_batch(case_list, self.harmonic_filter_n)
+            case_data = case_list[0]
+        else:
+            case_data = self.process_single_case(location, self.harmonic_filter_n)
+            if case_data is None:
+                return None
+        self.add_case(case_data)
+        return case_data
+    
+    def _ensure_all_processed(self):
+        """延迟加载模式下，汇总操作前批量处理全部case（只执行一次）"""
+        if self.lazy and not self._all_processed:
+            self.process_all_cases(self.harmonic_filter_n, batch=True)
     
     def parse_output_txt(self, output_file: str) -> tuple:
         """解析output.txt文件，提取Hm_dr和Hm_ds参数值"""
         hm_dr, hm_ds = None, None
+        lap = stage_timer(self.metrics)
         
         try:
             with open(output_file, 'r', encoding='utf-8') as f:
                 content = f.read()
+            lap('io')
                 
-            # 使用正则表达式提取参数值
-            hm_dr_match = re.search(r'Hm_dr\s*=\s*([\d.-]+)', content)
-            hm_ds_match = re.search(r'Hm_ds\s*=\s*([\d.-]+)', content)
+            # 使用正则表达式一次扫描提取参数值，每个参数取第一次出现的值
+            values = {}
+            for name, value in HM_PATTERN.findall(content):
+                values.setdefault(name, value)
             
-            if hm_dr_match:
-                hm_dr = float(hm_dr_match.group(1))
-            if hm_ds_match:
-                hm_ds = float(hm_ds_match.group(1))
+            if 'Hm_dr' in values:
+                hm_dr = float(values['Hm_dr'])
+            if 'Hm_ds' in values:
+                hm_ds = float(values['Hm_ds'])
+            lap('parse')
+            if self.metrics is not None and (hm_dr is None or hm_ds is None):
+                self.metrics.record_failure('hm_missing', output_file, "缺少Hm_dr或Hm_ds")
                 
         except Exception as e:
-            pass
+            if self.metrics is not None:
+                self.metrics.record_failure('output_txt', output_file, e)
             
         return hm_dr, hm_ds
     
-    def read_airgap_flux_csv(self, csv_file: str) -> Optional[pd.DataFrame]:
+    def read_airgap_flux_csv(self, csv_file: str) -> Optional['pd.DataFrame']:
         """读取airgapflux.csv文件中的气隙磁密数据"""
+        import pandas as pd
+        lap = stage_timer(self.metrics)
         try:
             df = pd.read_csv(csv_file)
+            lap('parse')
             return df
         except Exception as e:
+            if self.metrics is not None:
+                self.metrics.record_failure('airgapflux_csv', csv_file, e)
             return None
     
-    def process_single_case(self, case_dir: str, harmonic_filter_n: int = 1) -> Optional[CaseData]:
-        """处理单个case目录"""
+    def read_airgap_flux_arrays(self, csv_file: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        不经过pandas直接将airgapflux.csv读取为numpy数组
+        表头含引号、列名重复、数据为空或存在无法解析的数值等情况下，
+        退回pd.read_csv读取，保证结果与read_airgap_flux_csv一致
+        Returns:
+            列名到数据数组的字典，读取失败时返回None
+        """
+        lap = stage_timer(self.metrics)
+        try:
+            with open(csv_file, 'r', encoding='utf-8-sig') as f:
+                names = f.readline().rstrip('\r\n').split(',')
+                if '"' in ''.join(names) or len(set(names)) != len(names):
+                    raise ValueError(f"表头格式需要由pandas解析: {csv_file}")
+                values = np.loadtxt(f, delimiter=',', ndmin=2)
+            if values.shape[0] == 0 or values.shape[1] != len(names):
+                raise ValueError(f"数据为空或列数与表头不一致: {csv_file}")
+            columns = {name: np.ascontiguousarray(values[:, i]) for i, name in enumerate(names)}
+            lap('parse')
+            return columns
+        except Exception as e:
+            if self.metrics is not None:
+                self.metrics.count('fast_ingest_fallback')
+            df = self.read_airgap_flux_csv(csv_file)
+            return None if df is None else {col: df[col].values for col in df.columns}
+    
+    def load_case(self, case_dir: str) -> Optional[CaseData]:
+        """读取单个case目录的原始数据（不进行计算）"""
         case_name = os.path.basename(case_dir)
         case_id = case_name.split(".")[1] if "." in case_name else case_name
         
@@ -202,80 +1086,646 @@ class DataProcessor:
         
         # 检查必要文件是否存在
         if not os.path.exists(output_file) or not os.path.exists(airgap_file):
+            if self.metrics is not None:
+                self.metrics.record_failure('missing_files', case_dir)
             return None
+        if self.metrics is not None:
+            self.metrics.count('cases_loaded')
+            self.metrics.count('bytes_read', os.path.getsize(output_file) + os.path.getsize(airgap_file))
         
         # 解析output.txt文件
         case_data.hm_dr, case_data.hm_ds = self.parse_output_txt(output_file)
         
         # 读取airgapflux.csv文件
-        case_data.airgap_flux_data = self.read_airgap_flux_csv(airgap_file)
+        if self.fast_ingest:
+            case_data.flux_columns = self.read_airgap_flux_arrays(airgap_file)
+        else:
+            case_data.airgap_flux_data = self.read_airgap_flux_csv(airgap_file)
+        
+        return case_data
+    
+    def cache_params(self, harmonic_filter_n: int) -> dict:
+        """参与缓存键计算的处理参数"""
+        params = {'harmonic_filter_n': harmonic_filter_n}
+        if self.engine != 'full':
+            params['engine'] = self.engine
+        return params
+    
+    def load_cached_case(self, case_dir: str, harmonic_filter_n: int = 1) -> Optional[CaseData]:
+        """从磁盘缓存读取case结果，未启用缓存或缓存失效时返回None"""
+        if self.cache is None:
+            return None
+        lap = stage_timer(self.metrics)
+        entry = self.cache.load(case_dir, self.cache_params(harmonic_filter_n))
+        lap('cache')
+        if self.metrics is not None:
+            self.metrics.count('cache_misses' if entry is None else 'cache_hits')
+        if entry is None:
+            return None
+        case_data = CaseData.from_cache_entry(entry, harmonic_filter_n)
+        case_data.waveform_params = (harmonic_filter_n, self.engine)
+        return case_data
+    
+    def load_packed_cases(self, start: int = 0, stop: Optional[int] = None) -> List[CaseData]:
+        """
+        从打包文件读取第start到stop个case的原始数据，气隙磁密数据为内存映射上的视图
+        设置了分片时跳过不属于本分片的case
+        """
+        index = self.packed.index
+        stop = len(self.packed) if stop is None else min(stop, len(self.packed))
+        case_list = []
+        for i in range(start, stop):
+            if not self.in_shard(index['case_id'][i]):
+                continue
+            case_data = CaseData(str(index['case_id'][i]))
+            hm_dr, hm_ds = float(index['hm_dr'][i]), float(index['hm_ds'][i])
+            case_data.hm_dr = None if np.isnan(hm_dr) else hm_dr
+            case_data.hm_ds = None if np.isnan(hm_ds) else hm_ds
+            
+            arrays = self.packed.case_arrays(i)
+            if arrays is not None:
+                case_data.flux_columns = {'length': arrays[0], 'Bn': arrays[1]}
+            case_list.append(case_data)
+        return case_list
+    
+    def process_single_case(self, case_dir: str, harmonic_filter_n: int = 1) -> Optional[CaseData]:
+        """处理单个case目录"""
+        cached = self.load_cached_case(case_dir, harmonic_filter_n)
+        if cached is not None:
+            return cached
+        
+        case_data = self.load_case(case_dir)
+        if case_data is None:
+            return None
         
         # 处理气隙磁密数据（会计算Hm_delta）
-        case_data.process_airgap_flux(harmonic_filter_n)
+        case_data.process_airgap_flux(harmonic_filter_n, self.engine, self.metrics)
         
+        lap = stage_timer(self.metrics)
         # 计算饱和系数
         case_data.calculate_ksat()
         
         # 计算比值
         case_data.calculate_ratios()
+        lap('ratios')
+        self._count_processed([case_data])
+        
+        if self.cache is not None:
+            self.cache.store(case_dir, self.cache_params(harmonic_filter_n), case_data)
+            lap('cache')
         
         return case_data
     
-    def process_all_cases(self, harmonic_filter_n: int = 50):
-        """处理所有case目录"""
-        case_dirs = self.get_case_directories()
+    def _count_processed(self, case_list: List[CaseData]):
+        """统计处理完成的case数及其中无法得到Ksat的case数"""
+        if self.metrics is not None:
+            self.metrics.count('cases_processed', len(case_list))
+            self.metrics.count('cases_without_ksat', sum(case_data.ksat is None for case_data in case_list))
+    
+    def process_batch(self, case_list: List[CaseData], harmonic_filter_n: int = 50):
+        """
+        批量处理已读取的case：采样点数相同的case堆叠为二维数组后向量化计算
+        采样点数特殊（同组case数不足BATCH_MIN_GROUP）或数据异常的case退回逐个处理
+        """
+        groups: Dict[int, List[CaseData]] = {}
+        for case_data in case_list:
+            bn_data = _get_bn_values(case_data)
+            if bn_data is None or len(bn_data) < 3 or bn_data.dtype.kind not in 'fiu':
+                # 无法批量处理的case（含非数值数据），由逐个处理的路径给出与原来一致的结果，
+                # 不影响同组其他case的批量计算
+                case_data.process_airgap_flux(harmonic_filter_n, self.engine, self.metrics)
+            else:
+                groups.setdefault(len(bn_data), []).append(case_data)
         
-        if not case_dirs:
-            return
+        for n_points, group in groups.items():
+            if len(group) < BATCH_MIN_GROUP:
+                for case_data in group:
+                    case_data.process_airgap_flux(harmonic_filter_n, self.engine, self.metrics)
+                continue
+            
+            try:
+                # 堆叠为(case数, 采样点数)的二维数组
+                lap = stage_timer(self.metrics)
+                bn_matrix = np.stack([_get_bn_values(case_data) for case_data in group])
+                lap('stack')
+                results, full_cycle = compute_half_cycle_metrics(bn_matrix, harmonic_filter_n, self.engine,
+                                                                 self.metrics)
+            except Exception as e:
+                if self.metrics is not None:
+                    self.metrics.record_failure('batch_group', f"{len(group)} 个case × {n_points} 点", e)
+                for case_data in group:
+                    case_data.process_airgap_flux(harmonic_filter_n, self.engine, self.metrics)
+                continue
+            if self.metrics is not None:
+                self.metrics.count('batch_groups')
+            self._assign_batch_results(group, results, full_cycle, harmonic_filter_n)
         
-
+        lap = stage_timer(self.metrics)
+        for case_data in case_list:
+            case_data.calculate_ksat()
+            case_data.calculate_ratios()
+        lap('ratios')
+        self._count_processed(case_list)
+    
+    def _assign_batch_results(self, group: List[CaseData], results: Dict, full_cycle: Optional[np.ndarray],
+                              harmonic_filter_n: int):
+        """将批量计算结果（第i行对应group[i]）写入各case"""
+        for i, case_data in enumerate(group):
+            case_data.waveform_params = (harmonic_filter_n, self.engine)
+            case_data.full_cycle_flux = None if full_cycle is None else full_cycle[i]
+            for name in ('spectrum', 'harmonics', 'half_spectrum', 'filtered_signal'):
+                values = results.get(name)
+                setattr(case_data, name, None if values is None else values[i])
+            case_data.b_av = results['b_av'][i]
+            case_data.b_delta1 = results['b_delta1'][i]
+            case_data.b_delta = results['b_delta'][i]
+            case_data.hm_delta = results['hm_delta'][i]
+    
+    def ingest_arrays(self, bn, hm_dr, hm_ds, case_ids=None, length=None,
+                      harmonic_filter_n: Optional[int] = None, keep_waveforms: bool = True) -> 'pd.DataFrame':
+        """
+        直接处理内存中的气隙磁密数据（如优化循环中求解器给出的数组），不经过case目录、airgapflux.csv和output.txt
+        延拓、FFT、滤波、Ksat和比值的计算与process_batch相同，所有case作为一个二维数组一次计算，
+        结果加入self.cases和结果存储（case编号已存在时覆盖）
+        float64的Bn数组不复制：各case的Bn为传入数组的行视图，调用方之后不应原地修改该数组
+        Args:
+            bn: 半周期Bn序列，一维（单个case）或二维(case数, 采样点数)
+            hm_dr, hm_ds: 转子、定子齿部磁场强度，标量或长度为case数的数组，NaN表示缺失
+            case_ids: case编号，None时从已有最大编号之后依次编号
+            length: 长度坐标（mm），一维（所有case共用）或与bn形状相同；None时不保存（波形绘图需要长度坐标）
+            harmonic_filter_n: 谐波滤波次数，None时使用self.harmonic_filter_n
+            keep_waveforms: 是否保留各case的波形数据；False时只保留标量结果，适合长时间运行的优化循环
+        Returns:
+            本次各case的汇总结果（列与get_case_summary一致，按传入顺序）
+        """
+        harmonic_filter_n = self.harmonic_filter_n if harmonic_filter_n is None else harmonic_filter_n
+        bn_matrix = np.asarray(bn, dtype=float)
+        if bn_matrix.ndim == 1:
+            bn_matrix = bn_matrix[np.newaxis]
+        if bn_matrix.ndim != 2 or bn_matrix.shape[1] < 3:
+            raise ValueError(f"Bn应为一维或二维数组且至少有3个采样点: {bn_matrix.shape}")
+        n_cases = bn_matrix.shape[0]
+        hm_dr = np.broadcast_to(np.asarray(hm_dr, dtype=float), (n_cases,))
+        hm_ds = np.broadcast_to(np.asarray(hm_ds, dtype=float), (n_cases,))
+        if case_ids is None:
+            start = int(self.results.case_ids.max()) + 1 if len(self.results) else 0
+            case_ids = range(start, start + n_cases)
+        case_ids = [str(int(case_id)) for case_id in case_ids]
+        if len(case_ids) != n_cases:
+            raise ValueError(f"case编号数与Bn的case数不一致: {len(case_ids)} != {n_cases}")
+        if length is not None:
+            length = np.broadcast_to(np.asarray(length, dtype=float), bn_matrix.shape)
         
-        for case_dir in case_dirs:
-            case_data = self.process_single_case(case_dir, harmonic_filter_n)
-            if case_data:
-                self.cases[case_data.case_id] = case_data
+        case_list = []
+        for i, case_id in enumerate(case_ids):
+            case_data = CaseData(case_id)
+            case_data.hm_dr = None if np.isnan(hm_dr[i]) else float(hm_dr[i])
+            case_data.hm_ds = None if np.isnan(hm_ds[i]) else float(hm_ds[i])
+            case_data.flux_columns = {'Bn': bn_matrix[i]} if length is None else \
+                {'length': length[i], 'Bn': bn_matrix[i]}
+            case_list.append(case_data)
+        
+        results, full_cycle = compute_half_cycle_metrics(bn_matrix, harmonic_filter_n, self.engine, self.metrics)
+        self._assign_batch_results(case_list, results, full_cycle, harmonic_filter_n)
+        
+        lap = stage_timer(self.metrics)
+        for case_data in case_list:
+            case_data.calculate_ksat()
+            case_data.calculate_ratios()
+        lap('ratios')
+        self._count_processed(case_list)
+        
+        for case_data in case_list:
+            if not keep_waveforms:
+                case_data.release_waveforms()
+            # 内存中导入的case没有可重新读取的输入文件，不交给波形缓存管理
+            self.add_case(case_data, cache_waveforms=False)
+        return self.results.to_frame(np.array([self.results.row_of(case_id) for case_id in case_ids]))
+    
+    def map_case_dirs(self, method_name: str, case_dirs: List[str], args: tuple = (),
+                      workers: int = 1, pool: str = "process",
+                      chunksize: Optional[int] = None, executor: Optional[Executor] = None) -> list:
+        """
+        将case目录分块分发到进程池或线程池执行指定方法，结果按case_dirs原顺序返回
+        Args:
+            method_name: 对每个case目录调用的方法名，如"process_single_case"
+            case_dirs: case目录列表
+            args: 传给方法的其余参数
+            workers: 并行数，小于等于1时串行执行
+            pool: "process"使用进程池，"thread"使用线程池
+            chunksize: 每个任务处理的case数，None时按并行数自动确定
+            executor: 调用方持有的进程池或线程池（类型与pool一致），多次调用时复用，不在返回前关闭；
+                None时新建并在返回前关闭
+        """
+        if workers is None or workers <= 1 or len(case_dirs) <= 1:
+            method = getattr(self, method_name)
+            return [method(case_dir, *args) for case_dir in case_dirs]
+        
+        if chunksize is None:
+            # 每个worker约分到4个块，兼顾负载均衡和任务调度开销
+            chunksize = max(1, -(-len(case_dirs) // (workers * 4)))
+        chunks = [case_dirs[i:i + chunksize] for i in range(0, len(case_dirs), chunksize)]
+        
+        if pool == "thread":
+            executor_cls = ThreadPoolExecutor
+            target = self
+        elif pool == "process":
+            executor_cls = ProcessPoolExecutor
+            # 传给子进程的处理器副本不携带已处理的case
+            target = copy.copy(self)
+            target.cases = {}
+            target.results = ResultStore()
+            target._case_index = None
+            target.waveform_cache = None
+            # 子进程的统计写入各自的副本，随结果返回后合并
+            target.metrics = None if self.metrics is None else PipelineMetrics()
+        else:
+            raise ValueError(f"未知的并行方式: {pool}")
+        
+        n_chunks = len(chunks)
+        with executor_cls(max_workers=workers) if executor is None else nullcontext(executor) as executor:
+            results = []
+            for chunk_result, chunk_metrics in executor.map(_run_case_chunk, [target] * n_chunks,
+                                                            [method_name] * n_chunks, chunks,
+                                                            [args] * n_chunks):
+                results.extend(chunk_result)
+                if pool == "process" and chunk_metrics is not None:
+                    self.metrics.merge(chunk_metrics)
+            return results
+    
+    def process_all_cases(self, harmonic_filter_n: int = 50, batch: bool = False,
+                          workers: int = 1, pool: str = "process",
+                          chunksize: Optional[int] = None):
+        """
+        处理所有case目录
+        Args:
+            harmonic_filter_n: 谐波滤波次数
+            batch: 是否使用批量向量化计算（适用于大量采样点数相同的case）
+            workers: 并行处理的worker数，小于等于1时串行处理
+            pool: 并行方式，"process"（进程池）或"thread"（线程池）
+            chunksize: 每个并行任务处理的case数，None时自动确定
+        """
+        start = time.perf_counter()
+        try:
+            self.harmonic_filter_n = harmonic_filter_n
+            self._all_processed = True
+            
+            if self.packed is not None:
+                # 打包文件的数据已在同一内存映射中，直接批量计算
+                case_list = self.load_packed_cases()
+                self.process_batch(case_list, harmonic_filter_n)
+                for case_data in case_list:
+                    self.add_case(case_data)
+                return
+            
+            case_dirs = self.get_case_directories()
+            
+            if not case_dirs:
+                return
+            
+            if batch:
+                results = self._process_all_batch(case_dirs, harmonic_filter_n, workers, pool, chunksize)
+            else:
+                results = self.map_case_dirs("process_single_case", case_dirs, (harmonic_filter_n,),
+                                             workers, pool, chunksize)
+            for case_data in results:
+                if case_data:
+                    self.add_case(case_data)
+            
+            if self.cache is not None and (self.cache.max_age is not None or self.cache.max_bytes is not None):
+                self.cache.evict()
+        finally:
+            if self.metrics is not None:
+                self.metrics.wall_seconds += time.perf_counter() - start
+    
+    def _process_all_batch(self, case_dirs: List[str], harmonic_filter_n: int,
+                           workers: int, pool: str, chunksize: Optional[int]) -> List[Optional[CaseData]]:
+        """批量模式：命中缓存的case直接读取，其余case并行读取后在主进程中统一批量计算"""
+        results = [None] * len(case_dirs)
+        if self.cache is not None:
+            results = self.map_case_dirs("load_cached_case", case_dirs, (harmonic_filter_n,),
+                                         workers, pool, chunksize)
+        missing = [i for i, case_data in enumerate(results) if case_data is None]
+        
+        loaded = self.map_case_dirs("load_case", [case_dirs[i] for i in missing], (),
+                                    workers, pool, chunksize)
+        self.process_batch([case_data for case_data in loaded if case_data], harmonic_filter_n)
+        
+        for i, case_data in zip(missing, loaded):
+            results[i] = case_data
+            if case_data is not None and self.cache is not None:
+                self.cache.store(case_dirs[i], self.cache_params(harmonic_filter_n), case_data)
+        return results
+    
+    def evaluate_cutoffs(self, harmonic_filter_ns: List[int]) -> 'pd.DataFrame':
+        """
+        基于已保存的频谱计算多个谐波滤波次数下的结果
+        每个case只读取和FFT一次（尚未处理时以批量模式处理全部case），
+        每个截止次数只需对频谱滤波和反变换；sparse引擎按最大截止次数计算一次谐波系数，
+        每个截止次数取其前若干项求峰值
+        Args:
+            harmonic_filter_ns: 谐波滤波次数列表
+        Returns:
+            每行对应一个(case, 截止次数)组合的DataFrame，包含b_delta、hm_delta、
+            ksat、alpha_i、k_w；可用pivot(index='case_id', columns='harmonic_filter_n')转为case×截止次数的表格
+        """
+        import pandas as pd
+        columns = ['case_id', 'harmonic_filter_n', 'b_delta', 'hm_delta', 'ksat', 'alpha_i', 'k_w']
+        if not harmonic_filter_ns:
+            return pd.DataFrame(columns=columns)
+        
+        if self.lazy:
+            self._ensure_all_processed()
+        elif not self.cases:
+            self.process_all_cases(harmonic_filter_ns[0], batch=True)
+        
+        # 按频谱（sparse引擎为Bn序列，half_wave引擎为半波频谱）长度分组，组内堆叠后对每个截止次数向量化计算
+        sparse = self.engine == 'sparse'
+        half_wave = self.engine == 'half_wave'
+        groups: Dict[int, List[CaseData]] = {}
+        for case_data in self.cases.values():
+            if sparse:
+                bn_data = _get_bn_values(case_data)
+                if case_data.harmonics is not None and bn_data is not None:
+                    groups.setdefault(len(bn_data), []).append(case_data)
+            elif half_wave and case_data.half_spectrum is not None:
+                groups.setdefault(len(case_data.half_spectrum), []).append(case_data)
+            elif case_data.spectrum is not None:
+                groups.setdefault(len(case_data.spectrum), []).append(case_data)
+        
+        frames = []
+        for group in groups.values():
+            if sparse:
+                bn_matrix = np.stack([_get_bn_values(case_data) for case_data in group])
+                half = bn_matrix.shape[-1] - 1
+                harmonics = compute_flux_metrics_sparse(bn_matrix, max(harmonic_filter_ns))['harmonics']
+            elif half_wave:
+                half_spectra = np.stack([case_data.half_spectrum for case_data in group])
+            else:
+                spectra = np.stack([case_data.spectrum for case_data in group])
+            case_ids = [int(case_data.case_id) for case_data in group]
+            hm_dr = np.array([case_data.hm_dr for case_data in group], dtype=float)
+            hm_ds = np.array([case_data.hm_ds for case_data in group], dtype=float)
+            b_av = np.array([case_data.b_av for case_data in group], dtype=float)
+            b_delta1 = np.array([case_data.b_delta1 for case_data in group], dtype=float)
+            
+            for harmonic_filter_n in harmonic_filter_ns:
+                if sparse:
+                    n_harmonics = sparse_harmonic_count(half, harmonic_filter_n)
+                    b_delta = harmonic_peak(harmonics[..., :n_harmonics], 2 * half)
+                elif half_wave:
+                    _, b_delta = filter_half_wave_spectrum(half_spectra, harmonic_filter_n)
+                else:
+                    _, b_delta = filter_spectrum(spectra, harmonic_filter_n)
+                hm_delta = b_delta / MU_0
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    ksat = np.where(hm_delta != 0, compute_ksat(hm_dr, hm_ds, hm_delta), np.nan)
+                    alpha_i = np.where(b_delta != 0, b_av / b_delta, np.nan)
+                    k_w = np.where(b_delta1 != 0, b_delta / b_delta1, np.nan)
+                frames.append(pd.DataFrame({
+                    'case_id': case_ids,
+                    'harmonic_filter_n': harmonic_filter_n,
+                    'b_delta': b_delta,
+                    'hm_delta': hm_delta,
+                    'ksat': ksat,
+                    'alpha_i': alpha_i,
+                    'k_w': k_w,
+                }))
+        
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        
+        result = pd.concat(frames, ignore_index=True)
+        # 按case编号和截止次数排序
+        order = np.lexsort((result['harmonic_filter_n'].values, result['case_id'].values))
+        return result.iloc[order].reset_index(drop=True)
+    
+    def add_case(self, case_data: CaseData, cache_waveforms: bool = True):
+        """
+        将处理完成的case写入结果存储，CaseData此后作为存储中对应行的访问对象
+        Args:
+            cache_waveforms: 设置了波形缓存时是否由其管理该case的波形（需要能从输入文件重新加载）
+        """
+        row = self.results.add(case_data)
+        case_data.bind(self.results, row)
+        if self.waveform_cache is not None:
+            previous = self.cases.get(case_data.case_id)
+            if previous is not None and previous is not case_data:
+                previous.detach_waveform_cache()
+            if cache_waveforms:
+                case_data.attach_waveform_cache(self.waveform_cache, self._reload_waveforms)
+        self.cases[case_data.case_id] = case_data
+    
+    def _reload_waveforms(self, case_data: CaseData):
+        """
+        重新读取被波形缓存释放的case的气隙磁密数据并重新计算波形，标量结果保持不变
+        （批量计算的case在此按单个case重新计算，sparse引擎的谐波系数可能有舍入误差量级的差异）
+        """
+        location = self.locate_case(case_data.case_id)
+        if location is None:
+            return
+        if self.packed is not None:
+            arrays = self.packed.case_arrays(location)
+            case_data.flux_columns = None if arrays is None else {'length': arrays[0], 'Bn': arrays[1]}
+        elif self.fast_ingest:
+            case_data.flux_columns = self.read_airgap_flux_arrays(os.path.join(location, "airgapflux.csv"))
+        else:
+            case_data.airgap_flux_data = self.read_airgap_flux_csv(os.path.join(location, "airgapflux.csv"))
+        
+        bn_data = _get_bn_values(case_data)
+        if bn_data is None or case_data.waveform_params is None:
+            return
+        try:
+            results, full_cycle = compute_half_cycle_metrics(bn_data, *case_data.waveform_params)
+        except Exception as e:
+            return
+        case_data.full_cycle_flux = full_cycle
+        case_data.spectrum = results['spectrum']
+        case_data.harmonics = results.get('harmonics')
+        case_data.half_spectrum = results.get('half_spectrum')
+        case_data.filtered_signal = results['filtered_signal']
     
     def get_case_data(self, case_id: str) -> Optional[CaseData]:
-        """获取指定case的数据"""
-        return self.cases.get(case_id)
+        """获取指定case的数据，延迟加载模式下首次访问时读取并处理该case"""
+        case_data = self.cases.get(case_id)
+        if case_data is None and self.lazy and not self._all_processed:
+            case_data = self._load_case_on_demand(case_id)
+        return case_data
     
     def get_all_cases(self) -> Dict[str, CaseData]:
         """获取所有case数据"""
+        self._ensure_all_processed()
         return self.cases
     
-    def get_case_summary(self) -> pd.DataFrame:
-        """获取所有case的核心计算结果"""
-        summary_data = []
-        for case_id, case_data in self.cases.items():
-            summary_data.append({
-                'case_id': case_data.case_id,
-                'hm_delta': case_data.hm_delta,
-                'hm_dr': case_data.hm_dr,
-                'hm_ds': case_data.hm_ds,
-                'ksat': case_data.ksat,
-                'b_av': case_data.b_av,
-                'b_delta1': case_data.b_delta1,
-                'b_delta': case_data.b_delta,
-                'alpha_i': case_data.alpha_i,
-                'k_nm': case_data.k_nm,
-                'k_w': case_data.k_w
-            })
-        
-        return pd.DataFrame(summary_data)
+    def get_case_summary(self) -> 'pd.DataFrame':
+        """获取所有case的核心计算结果（各列直接引用结果存储中的数组）"""
+        self._ensure_all_processed()
+        return self.results.to_frame()
+    
+    def ksat_grid(self, rotor_tooth_heights=ROTOR_TOOTH_HEIGHT, stator_tooth_heights=STATOR_TOOTH_HEIGHT,
+                  air_gaps=AIR_GAP, outer: bool = False) -> np.ndarray:
+        """
+        由已计算的Hm_dr、Hm_ds、Hm_delta对所有case和多组几何尺寸一次广播计算Ksat，
+        直接使用结果存储中的数组，不重新读取或滤波任何波形
+        Args:
+            rotor_tooth_heights, stator_tooth_heights, air_gaps: 转子齿高、定子齿高、气隙长度（mm），标量或数组
+            outer: 是否取三者的所有组合，见compute_ksat_grid
+        Returns:
+            Ksat数组，第一维与self.results.case_ids对应，其后各维对应几何尺寸
+        """
+        self._ensure_all_processed()
+        return compute_ksat_grid(self.results.column('hm_dr'), self.results.column('hm_ds'),
+                                 self.results.column('hm_delta'), rotor_tooth_heights,
+                                 stator_tooth_heights, air_gaps, outer)
+    
+    def process_case_scalars(self, case_dir: str, harmonic_filter_n: int = 1) -> Optional[CaseData]:
+        """处理单个case目录，只返回标量结果（波形数据计算后立即释放）"""
+        case_data = self.process_single_case(case_dir, harmonic_filter_n)
+        if case_data is not None:
+            case_data.release_waveforms()
+        return case_data
+    
+    def iter_cases(self, harmonic_filter_n: int = 50, workers: int = 1, pool: str = "process",
+                   skip_case_ids: Optional[set] = None) -> Iterator[CaseData]:
+        """
+        按case编号顺序逐个处理并返回结果，结果不保存在处理器中，内存占用与case总数无关
+        返回的CaseData只保留标量结果，波形数据计算后立即释放
+        Args:
+            harmonic_filter_n: 谐波滤波次数
+            workers: 并行数，并行时每次处理workers * STREAM_BLOCK_SIZE个case
+            pool: 并行方式，"process"或"thread"
+            skip_case_ids: 跳过的case编号（整数），用于断点续算
+        """
+        skip_case_ids = set() if skip_case_ids is None else {int(case_id) for case_id in skip_case_ids}
+        block_size = max(1, workers) * STREAM_BLOCK_SIZE
+        
+        if self.packed is not None:
+            for start in range(0, len(self.packed), block_size):
+                case_list = [case_data for case_data in self.load_packed_cases(start, start + block_size)
+                             if int(case_data.case_id) not in skip_case_ids]
+                self.process_batch(case_list, harmonic_filter_n)
+                for case_data in case_list:
+                    case_data.release_waveforms()
+                    yield case_data
+            return
+        
+        case_dirs = [case_dir for case_dir in self.get_case_directories()
+                     if int(os.path.basename(case_dir).split(".")[1]) not in skip_case_ids]
+        for start in range(0, len(case_dirs), block_size):
+            block = case_dirs[start:start + block_size]
+            for case_data in self.map_case_dirs("process_case_scalars", block, (harmonic_filter_n,),
+                                                workers, pool):
+                if case_data is not None:
+                    yield case_data
+    
+    def stream_to_csv(self, filename: str = "calculated_results.csv", output_dir: str = "output_results",
+                      harmonic_filter_n: int = 50, resume: bool = True,
+                      workers: int = 1, pool: str = "process") -> str:
+        """
+        流式处理所有case，每得到一个结果立即追加一行到CSV文件（列与save_to_csv一致）
+        中断后文件中为已完成case的有效结果；resume=True时跳过文件中已有的case继续处理。
+        处理参数（harmonic_filter_n、engine）记录在CSV旁的参数文件中，续算时与本次参数不一致
+        （或没有参数文件）则报错，不把不同参数的结果写进同一个文件，此时可用resume=False重新开始
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        full_path = os.path.join(output_dir, filename)
+        params_path = full_path + STREAM_PARAMS_SUFFIX
+        params = {'harmonic_filter_n': harmonic_filter_n, 'engine': self.engine}
+        
+        done_ids = _read_streamed_case_ids(full_path) if resume else None
+        if done_ids is not None and _read_stream_params(params_path) != params:
+            raise ValueError(f"已有文件的处理参数与本次不一致，无法续算（resume=False时重新开始）: {full_path}")
+        if done_ids is None:
+            # 先写参数文件再写表头，中断在两者之间时CSV为空，下次重新开始
+            with open(params_path, 'w', encoding='utf-8') as f:
+                json.dump(params, f)
+            with open(full_path, 'w', encoding='utf-8-sig', newline='') as f:
+                f.write(','.join(SUMMARY_COLUMNS) + '\n')
+            done_ids = set()
+        
+        with open(full_path, 'a', encoding='utf-8-sig', newline='') as f:
+            for case_data in self.iter_cases(harmonic_filter_n, workers, pool, done_ids):
+                f.write(_format_summary_row(case_data) + '\n')
+                f.flush()
+        return full_path
     
     def save_to_csv(self, filename: str = "calculated_results.csv", output_dir: str = "output_results"):
         """将所有数据保存为CSV文件"""
         import os
         os.makedirs(output_dir, exist_ok=True)
         
-        df = self.get_case_summary()
-        # 按case_id排序
-        df['case_id_num'] = df['case_id'].astype(int)
-        df = df.sort_values('case_id_num').drop('case_id_num', axis=1)
-        
+        # 按case_id排序，直接由结果存储的数组逐行写出（格式与stream_to_csv一致，不需要pandas）
+        self._ensure_all_processed()
         full_path = os.path.join(output_dir, filename)
-        df.to_csv(full_path, index=False, encoding='utf-8-sig')
+        self.results.write_csv(full_path, self.results.sort_order('case_id'))
         return full_path
+    
+    def save_to_columnar(self, filename: str = "calculated_results" + COLUMNAR_EXT,
+                         output_dir: str = "output_results", waveforms: bool = True) -> str:
+        """
+        将所有数据追加到二进制列式导出目录（见columnar_export），读取时可内存映射；
+        目录中已有的case跳过，只写入新的case
+        Args:
+            waveforms: 是否同时导出完整周期数据和滤波后的信号（只在首次创建目录时生效）
+        """
+        self._ensure_all_processed()
+        full_path = os.path.join(output_dir, filename)
+        case_list = sorted(self.cases.values(), key=lambda case_data: int(case_data.case_id))
+        append_cases(full_path, case_list, WAVEFORM_FIELDS if waveforms else ())
+        return full_path
+
+
+# 汇总结果CSV的列
+SUMMARY_COLUMNS = ['case_id'] + RESULT_FIELDS
+
+# 流式输出CSV的处理参数文件后缀（与CSV同名）
+STREAM_PARAMS_SUFFIX = ".params.json"
+
+
+def _format_summary_row(case_data: CaseData) -> str:
+    """将case结果格式化为汇总CSV的一行，缺失值为空"""
+    values = [str(int(case_data.case_id))]
+    for field in RESULT_FIELDS:
+        values.append(format_csv_value(getattr(case_data, field)))
+    return ','.join(values)
+
+
+def _read_streamed_case_ids(csv_file: str) -> Optional[set]:
+    """
+    读取流式输出CSV中已完成的case编号，文件不存在或为空时返回None
+    中断时写了一半的最后一行会被截掉，使文件保持为有效的CSV
+    """
+    if not os.path.exists(csv_file):
+        return None
+    
+    with open(csv_file, 'rb+') as f:
+        content = f.read()
+        if not content.endswith(b'\n'):
+            content = content[:content.rfind(b'\n') + 1]
+            f.seek(0)
+            f.truncate(len(content))
+    
+    lines = content.decode('utf-8-sig').splitlines()
+    if not lines:
+        return None
+    if lines[0].split(',') != SUMMARY_COLUMNS:
+        raise ValueError(f"已有文件的列与汇总结果不一致，无法续算: {csv_file}")
+    return {int(line.split(',', 1)[0]) for line in lines[1:] if line}
+
+
+def _read_stream_params(params_file: str) -> Optional[dict]:
+    """读取流式输出CSV的处理参数，文件不存在或无法解析时返回None"""
+    try:
+        with open(params_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _run_case_chunk(processor: DataProcessor, method_name: str, case_dirs: List[str], args: tuple) -> tuple:
+    """并行任务：对一块case目录依次调用处理器的方法，返回(结果列表, 处理器的统计对象)"""
+    method = getattr(processor, method_name)
+    return [method(case_dir, *args) for case_dir in case_dirs], processor.metrics
 
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+统一命令行入口：处理参数扫描目录并输出汇总结果、表格、曲线图和波形图
+一次调用中可以给出多个子命令，它们共享同一份处理结果，扫描目录只处理一次；
+numpy等计算模块在解析参数后才导入，pandas只在输出表格、matplotlib只在绘图时导入
+
+用法:
+    python ksat.py process                         # 处理并保存汇总结果CSV（不导入pandas和matplotlib）
+    python ksat.py table curves                    # 输出表格和曲线图（只处理一次）
+    python ksat.py waveform --cases 8 12           # 只读取和处理case 8、12并渲染波形图
+    python ksat.py overlay --max-points 400        # 所有case的波形降采样后叠加为一张图，按Ksat着色
+    python ksat.py process table curves waveform --sweep prmtric.2 --harmonic-filter-n 10
+"""
+
+import sys
+import time
+import argparse
+from typing import List, Optional
+
+
+# 子命令，按给出的顺序执行
+COMMANDS = ('process', 'table', 'curves', 'waveform', 'overlay')
+
+
+class SweepSession:
+    """一次调用中各子命令共享的处理结果：延迟加载模式的DataProcessor，汇总输出前只批量处理一次"""
+    
+    def __init__(self, sweep: str, harmonic_filter_n: int, engine: str, cache: bool):
+        from data_processor import DataProcessor
+        from case_cache import CaseCache
+        
+        self.processor = DataProcessor(sweep, cache=CaseCache() if cache else None, fast_ingest=True,
+                                       engine=engine, lazy=True, harmonic_filter_n=harmonic_filter_n)
+        self._valid_data = None
+    
+    def valid_data(self):
+        """表格和曲线图使用的有效case（按Ksat排序的DataFrame，只构造一次）"""
+        if self._valid_data is None:
+            from visualization import select_valid_data
+            self.processor.get_all_cases()
+            self._valid_data = select_valid_data(self.processor)
+        return self._valid_data
+
+
+def run_process(session: SweepSession, args) -> None:
+    """处理全部case并保存汇总结果CSV"""
+    cases = session.processor.get_all_cases()
+    path = session.processor.save_to_csv(args.output, args.output_dir)
+    print(f"已处理 {len(cases)} 个case，结果已保存到: {path}")
+
+
+def run_table(session: SweepSession, args) -> None:
+    """输出Ksat对alpha_i、K_Nm、K_W的表格"""
+    from visualization import create_data_table
+    create_data_table(session.valid_data())
+
+
+def run_curves(session: SweepSession, args) -> None:
+    """输出Ksat曲线图"""
+    from visualization import create_curves
+    create_curves(session.valid_data())
+    print(f"曲线图已保存到文件夹: {args.output_dir}")
+
+
+def run_waveform(session: SweepSession, args) -> None:
+    """渲染case波形图片，未处理全部case时只读取和处理指定的case"""
+    from waveform_display import render_waveforms
+    written = render_waveforms(args.cases, output_dir=args.output_dir, dpi=args.dpi,
+                               force=args.force, processor=session.processor)
+    print(f"已渲染 {len(written)} 张波形图到: {args.output_dir}")
+
+
+def run_overlay(session: SweepSession, args) -> None:
+    """将case波形降采样后叠加绘制在一张图中，按Ksat着色"""
+    import os
+    from waveform_display import plot_overlay
+    path = plot_overlay(args.cases, output_path=os.path.join(args.output_dir, args.overlay_output),
+                        max_points=args.max_points, dpi=args.dpi, processor=session.processor)
+    print(f"波形叠加图已保存到: {path}")
+
+
+RUNNERS = {
+    'process': run_process,
+    'table': run_table,
+    'curves': run_curves,
+    'waveform': run_waveform,
+    'overlay': run_overlay,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="ksat", description="饱和系数Ksat计算与可视化",
+                                     epilog="可同时给出多个子命令，各子命令共享同一份处理结果")
+    parser.add_argument('commands', nargs='+', choices=COMMANDS, metavar='command',
+                        help="子命令: process（汇总结果CSV）、table（数据表格）、curves（曲线图）、"
+                             "waveform（波形图）、overlay（多case波形叠加图）")
+    parser.add_argument('--sweep', default="prmtric.1", help="参数扫描目录或打包文件")
+    parser.add_argument('--harmonic-filter-n', type=int, default=5, help="谐波滤波次数")
+    parser.add_argument('--engine', default='full', help="计算引擎（full、half_wave、sparse）")
+    parser.add_argument('--no-cache', action='store_true', help="不使用磁盘缓存，重新计算所有case")
+    parser.add_argument('--output-dir', default="output_results", help="输出文件夹")
+    parser.add_argument('--output', default="calculated_results.csv", help="process输出的汇总结果文件名")
+    parser.add_argument('--cases', nargs='+', type=int, help="waveform、overlay绘制的case编号，默认全部case")
+    parser.add_argument('--dpi', type=int, default=150, help="waveform、overlay图片分辨率")
+    parser.add_argument('--force', action='store_true', help="waveform忽略已有图片全部重新渲染")
+    parser.add_argument('--max-points', type=int, default=400, help="overlay中每条波形降采样后的最大点数")
+    parser.add_argument('--overlay-output', default="waveform_overlay.png", help="overlay图片文件名")
+    parser.add_argument('--timing', action='store_true', help="输出各子命令的耗时")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    start = time.perf_counter()
+    try:
+        session = SweepSession(args.sweep, args.harmonic_filter_n, args.engine, not args.no_cache)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.output_dir != "output_results":
+        import visualization
+        visualization.OUTPUT_DIR = args.output_dir
+    
+    for command in dict.fromkeys(args.commands):
+        RUNNERS[command](session, args)
+        if args.timing:
+            now = time.perf_counter()
+            print(f"[{command}] {now - start:.3f} s", file=sys.stderr)
+            start = now
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Ksat查表：由参数扫描结果对alpha_i、K_Nm、K_W分别建立保形（PCHIP）分段三次插值，
+对任意Ksat数组批量查询（每个点一次二分查找 + 一次三次多项式求值）。
+插值表可保存为.npz文件，设计优化程序直接加载，无需读取prmtric.1。
+"""
+
+import sys
+import numpy as np
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+# 设计优化程序只加载.npz插值表，不需要pandas
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# 默认建立插值的系数
+LOOKUP_FIELDS = ['alpha_i', 'k_nm', 'k_w']
+
+# 超出Ksat范围时的处理方式：clip - 取端点值，nan - 返回NaN
+EXTRAPOLATE_MODES = ('clip', 'nan')
+
+
+def pchip_slopes(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Fritsch-Carlson保形插值的节点导数（沿最后一维），
+    相邻区间斜率异号或为零的节点导数取0，保证插值曲线在数据单调的区间内单调、不产生过冲
+    Args:
+        x: 严格递增的节点
+        y: 节点值，最后一维与x对应（支持多个系数堆叠的二维数组）
+    """
+    h = np.diff(x)
+    delta = np.diff(y, axis=-1) / h
+    slopes = np.zeros_like(y, dtype=float)
+    n = len(x)
+    if n < 2:
+        return slopes
+    if n == 2:
+        slopes[..., 0] = slopes[..., 1] = delta[..., 0]
+        return slopes
+    
+    # 内部节点：两侧斜率同号时取加权调和平均
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    same_sign = delta[..., :-1] * delta[..., 1:] > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        harmonic = (w1 + w2) / (w1 / delta[..., :-1] + w2 / delta[..., 1:])
+    slopes[..., 1:-1] = np.where(same_sign, harmonic, 0.0)
+    
+    # 端点：三点公式，并限制符号和幅值以保持形状
+    slopes[..., 0] = _end_slope(h[0], h[1], delta[..., 0], delta[..., 1])
+    slopes[..., -1] = _end_slope(h[-1], h[-2], delta[..., -1], delta[..., -2])
+    return slopes
+
+
+def _end_slope(h0: float, h1: float, delta0: np.ndarray, delta1: np.ndarray) -> np.ndarray:
+    """端点导数的保形三点估计"""
+    slope = ((2 * h0 + h1) * delta0 - h0 * delta1) / (h0 + h1)
+    slope = np.where(np.sign(slope) != np.sign(delta0), 0.0, slope)
+    overshoot = (np.sign(delta0) != np.sign(delta1)) & (np.abs(slope) > 3 * np.abs(delta0))
+    return np.where(overshoot, 3 * delta0, slope)
+
+
+class KsatLookup:
+    """Ksat到alpha_i、K_Nm、K_W等系数的保形插值表"""
+    
+    def __init__(self, ksat: np.ndarray, values: Dict[str, np.ndarray], extrapolate: str = 'clip'):
+        """
+        Args:
+            ksat: Ksat节点（可以无序、可以重复，重复节点的系数取平均）
+            values: 系数名到节点值数组的字典
+            extrapolate: 超出Ksat范围时的处理方式，见EXTRAPOLATE_MODES
+        """
+        if extrapolate not in EXTRAPOLATE_MODES:
+            raise ValueError(f"未知的外推方式: {extrapolate}")
+        ksat = np.asarray(ksat, dtype=float)
+        if len(ksat) == 0:
+            raise ValueError("没有可用于建立插值表的数据")
+        
+        self.fields: List[str] = list(values)
+        self.extrapolate = extrapolate
+        
+        # 节点排序，重复的Ksat合并为一个节点
+        knots, inverse = np.unique(ksat, return_inverse=True)
+        counts = np.bincount(inverse)
+        nodes = np.array([np.bincount(inverse, weights=np.asarray(values[field], dtype=float)) / counts
+                          for field in self.fields])
+        self.ksat = knots
+        self.values = nodes
+        
+        # 每个区间的三次多项式系数 y = c0 + c1·t + c2·t² + c3·t³（t为到区间左端点的距离），
+        # 形状为(系数数, 4, 区间数)，查询时按区间号直接取出
+        n_intervals = max(len(knots) - 1, 1)
+        self.coeffs = np.zeros((len(self.fields), 4, n_intervals))
+        self.coeffs[:, 0, :] = nodes[:, :n_intervals]
+        if len(knots) > 1:
+            h = np.diff(knots)
+            delta = np.diff(nodes, axis=-1) / h
+            slopes = pchip_slopes(knots, nodes)
+            self.coeffs[:, 1, :] = slopes[:, :-1]
+            self.coeffs[:, 2, :] = (3 * delta - 2 * slopes[:, :-1] - slopes[:, 1:]) / h
+            self.coeffs[:, 3, :] = (slopes[:, :-1] + slopes[:, 1:] - 2 * delta) / h ** 2
+    
+    @classmethod
+    def from_summary(cls, summary: 'pd.DataFrame', fields: Optional[List[str]] = None,
+                     extrapolate: str = 'clip') -> 'KsatLookup':
+        """由DataProcessor.get_case_summary()的结果建立插值表，忽略Ksat或系数缺失的case"""
+        fields = LOOKUP_FIELDS if fields is None else fields
+        data = summary[['ksat'] + fields].astype(float).dropna()
+        return cls(data['ksat'].values, {field: data[field].values for field in fields}, extrapolate)
+    
+    @classmethod
+    def from_processor(cls, processor, fields: Optional[List[str]] = None,
+                       extrapolate: str = 'clip') -> 'KsatLookup':
+        """由已处理（或延迟加载）的DataProcessor建立插值表"""
+        return cls.from_summary(processor.get_case_summary(), fields, extrapolate)
+    
+    def query(self, ksat, fields: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        批量查询，每个点一次二分查找
+        Args:
+            ksat: Ksat标量或数组
+            fields: 要查询的系数，None表示全部
+        Returns:
+            系数名到结果数组（形状与ksat相同）的字典
+        """
+        x = np.asarray(ksat, dtype=float)
+        n_intervals = self.coeffs.shape[-1]
+        index = np.clip(np.searchsorted(self.ksat, x, side='right') - 1, 0, n_intervals - 1)
+        # 超出范围时取端点值：t限制在第一个区间的左端点和最后一个区间的右端点
+        if len(self.ksat) > 1:
+            t = np.clip(x, self.ksat[0], self.ksat[-1]) - self.ksat[index]
+        else:
+            t = np.zeros_like(x)
+        outside = (x < self.ksat[0]) | (x > self.ksat[-1]) if self.extrapolate == 'nan' else None
+        
+        result = {}
+        for field in (self.fields if fields is None else fields):
+            c0, c1, c2, c3 = self.coeffs[self.fields.index(field)]
+            value = c0[index] + t * (c1[index] + t * (c2[index] + t * c3[index]))
+            if outside is not None:
+                value = np.where(outside, np.nan, value)
+            result[field] = value
+        return result
+    
+    def __call__(self, ksat, field: str) -> np.ndarray:
+        """查询单个系数"""
+        return self.query(ksat, [field])[field]
+    
+    def save(self, path: str) -> str:
+        """保存为.npz文件（只包含numpy数组，加载时不需要pandas或原始数据）"""
+        np.savez(path, ksat=self.ksat, values=self.values, coeffs=self.coeffs,
+                 fields=np.array(self.fields), extrapolate=np.array(self.extrapolate))
+        return path if path.endswith('.npz') else path + '.npz'
+    
+    @classmethod
+    def load(cls, path: str) -> 'KsatLookup':
+        """加载save保存的插值表"""
+        with np.load(path) as data:
+            lookup = cls.__new__(cls)
+            lookup.fields = [str(field) for field in data['fields']]
+            lookup.extrapolate = str(data['extrapolate'])
+            lookup.ksat = data['ksat']
+            lookup.values = data['values']
+            lookup.coeffs = data['coeffs']
+        return lookup
+
+
+if __name__ == "__main__":
+    # 用法: python ksat_lookup.py [参数扫描目录或打包文件] [输出文件]
+    from data_processor import DataProcessor
+    from case_cache import CaseCache
+    
+    base_dir = sys.argv[1] if len(sys.argv) > 1 else "prmtric.1"
+    out_file = sys.argv[2] if len(sys.argv) > 2 else "ksat_lookup.npz"
+    processor = DataProcessor(base_dir, cache=CaseCache(), fast_ingest=True)
+    processor.process_all_cases(harmonic_filter_n=5, batch=True)
+    lookup = KsatLookup.from_processor(processor)
+    print(f"已由 {len(lookup.ksat)} 个Ksat节点建立插值表: {lookup.save(out_file)}")
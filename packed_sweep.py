@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+参数扫描打包格式：将整个prmtric.*目录打包为一个可内存映射的二进制文件
+文件结构（小端序，各段均按8字节对齐）：
+    文件头（64字节）：标识、版本、case数、数据点总数、各段偏移
+    索引段：每个case一条记录(case_id, offset, count, hm_dr, hm_ds)
+    Bn段：所有case的Bn数据连续存放
+    length段：所有case的length数据连续存放
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+from typing import Optional, Tuple
+
+
+PACKED_MAGIC = b'KSATPACK'
+PACKED_VERSION = 1
+PACKED_EXT = ".ksatpack"
+
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('reserved', '<u4'),
+    ('n_cases', '<i8'),
+    ('n_values', '<i8'),
+    ('index_offset', '<i8'),
+    ('bn_offset', '<i8'),
+    ('length_offset', '<i8'),
+])
+
+# count为-1表示该case的气隙磁密数据缺失或无法读取；hm_dr/hm_ds缺失时为NaN
+INDEX_DTYPE = np.dtype([
+    ('case_id', '<i8'),
+    ('offset', '<i8'),
+    ('count', '<i8'),
+    ('hm_dr', '<f8'),
+    ('hm_ds', '<f8'),
+])
+
+# 打包时每次读取的case数
+PACK_CHUNK_SIZE = 1024
+
+
+def pack_sweep(base_dir: str, out_file: Optional[str] = None, workers: int = 1) -> str:
+    """
+    将参数扫描目录打包为单个二进制文件
+    Args:
+        base_dir: 参数扫描目录，如"prmtric.1"
+        out_file: 输出文件路径，None时为base_dir + ".ksatpack"
+        workers: 读取case数据的并行数
+    Returns:
+        输出文件路径
+    """
+    from data_processor import DataProcessor
+    
+    if out_file is None:
+        out_file = base_dir.rstrip("/\\") + PACKED_EXT
+    
+    processor = DataProcessor(base_dir, fast_ingest=True)
+    case_dirs = processor.get_case_directories()
+    
+    index = np.zeros(len(case_dirs), dtype=INDEX_DTYPE)
+    index_offset = HEADER_SIZE
+    bn_offset = index_offset + index.nbytes
+    n_cases = 0
+    n_values = 0
+    
+    tmp_file = out_file + ".tmp"
+    with open(tmp_file, 'wb') as f, tempfile.TemporaryFile() as length_tmp:
+        # 预留文件头和索引段，Bn数据直接写入，length数据先写入临时文件
+        f.write(b'\0' * bn_offset)
+        for start in range(0, len(case_dirs), PACK_CHUNK_SIZE):
+            chunk = case_dirs[start:start + PACK_CHUNK_SIZE]
+            for case_data in processor.map_case_dirs("load_case", chunk, (), workers):
+                if case_data is None:
+                    continue
+                
+                record = index[n_cases]
+                record['case_id'] = int(case_data.case_id)
+                record['hm_dr'] = np.nan if case_data.hm_dr is None else case_data.hm_dr
+                record['hm_ds'] = np.nan if case_data.hm_ds is None else case_data.hm_ds
+                record['count'] = -1
+                
+                columns = case_data.flux_columns
+                if columns is not None and 'Bn' in columns and 'length' in columns:
+                    try:
+                        bn = np.ascontiguousarray(columns['Bn'], dtype='<f8')
+                        length = np.ascontiguousarray(columns['length'], dtype='<f8')
+                    except (TypeError, ValueError):
+                        bn = length = None
+                    if bn is not None:
+                        record['offset'] = n_values
+                        record['count'] = len(bn)
+                        f.write(bn.tobytes())
+                        length_tmp.write(length.tobytes())
+                        n_values += len(bn)
+                n_cases += 1
+        
+        length_offset = bn_offset + 8 * n_values
+        length_tmp.seek(0)
+        shutil.copyfileobj(length_tmp, f)
+        
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = PACKED_MAGIC
+        header['version'] = PACKED_VERSION
+        header['n_cases'] = n_cases
+        header['n_values'] = n_values
+        header['index_offset'] = index_offset
+        header['bn_offset'] = bn_offset
+        header['length_offset'] = length_offset
+        f.seek(0)
+        f.write(header.tobytes().ljust(HEADER_SIZE, b'\0'))
+        f.write(index[:n_cases].tobytes())
+    
+    os.replace(tmp_file, out_file)
+    return out_file
+
+
+class PackedSweep:
+    """以内存映射方式打开的打包参数扫描文件"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) != 1 or header['magic'][0] != PACKED_MAGIC:
+            raise ValueError(f"不是有效的打包文件: {path}")
+        if header['version'][0] != PACKED_VERSION:
+            raise ValueError(f"不支持的打包文件版本: {header['version'][0]}")
+        
+        n_cases = int(header['n_cases'][0])
+        n_values = int(header['n_values'][0])
+        index_offset = int(header['index_offset'][0])
+        bn_offset = int(header['bn_offset'][0])
+        length_offset = int(header['length_offset'][0])
+        
+        # 整个文件只建立一个内存映射，各段为其上的视图
+        self._mmap = np.memmap(path, dtype=np.uint8, mode='r')
+        self.index = self._mmap[index_offset:index_offset + n_cases * INDEX_DTYPE.itemsize].view(INDEX_DTYPE)
+        self.bn = self._mmap[bn_offset:bn_offset + 8 * n_values].view('<f8')
+        self.length = self._mmap[length_offset:length_offset + 8 * n_values].view('<f8')
+    
+    def __len__(self) -> int:
+        return len(self.index)
+    
+    def case_arrays(self, i: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """第i个case的(length, Bn)数组视图，数据缺失时返回None"""
+        offset, count = int(self.index['offset'][i]), int(self.index['count'][i])
+        if count < 0:
+            return None
+        return self.length[offset:offset + count], self.bn[offset:offset + count]
+
+
+if __name__ == "__main__":
+    # 用法: python packed_sweep.py [参数扫描目录] [输出文件]
+    base_dir = sys.argv[1] if len(sys.argv) > 1 else "prmtric.1"
+    out_file = sys.argv[2] if len(sys.argv) > 2 else None
+    packed_file = pack_sweep(base_dir, out_file)
+    print(f"已打包 {len(PackedSweep(packed_file))} 个case到 {packed_file}")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+处理流程的分阶段计时和错误统计：记录各阶段（读取、解析、延拓、FFT、滤波、归约等）的耗时和调用次数、
+读取的字节数、case计数，以及按类别统计的失败次数和示例，可保存为JSON或输出到日志。
+未启用时（DataProcessor.metrics为None）各计时点只是一次空函数调用，几乎没有额外开销。
+"""
+
+import json
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# 每个失败类别保留的示例数
+MAX_FAILURE_EXAMPLES = 5
+
+
+def _no_lap(stage: str):
+    """未启用统计时的计时点"""
+
+
+def stage_timer(metrics: Optional['PipelineMetrics']) -> Callable[[str], None]:
+    """
+    分段计时器：每次调用lap(stage)将距上一次调用（或创建计时器）的耗时记入该阶段
+    metrics为None时返回空函数
+    """
+    if metrics is None:
+        return _no_lap
+    return metrics.lap_timer()
+
+
+class PipelineMetrics:
+    """处理流程的统计信息，可在多个线程间共享，进程池中各worker的统计通过merge合并"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, List[float]] = {}  # 阶段 -> [累计耗时（秒）, 调用次数]
+        self.counters: Dict[str, int] = {}  # case计数、读取字节数等
+        self.failures: Dict[str, int] = {}  # 失败类别 -> 次数
+        self.failure_examples: Dict[str, List[str]] = {}  # 失败类别 -> 前几个失败的说明
+        self.wall_seconds = 0.0  # process_all_cases等整体操作的墙钟时间
+    
+    def add_time(self, stage: str, seconds: float, calls: int = 1):
+        """记入一个阶段的耗时"""
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                self.stages[stage] = [seconds, calls]
+            else:
+                entry[0] += seconds
+                entry[1] += calls
+    
+    def lap_timer(self) -> Callable[[str], None]:
+        """分段计时器，见stage_timer"""
+        last = time.perf_counter()
+        
+        def lap(stage: str):
+            nonlocal last
+            now = time.perf_counter()
+            self.add_time(stage, now - last)
+            last = now
+        
+        return lap
+    
+    def count(self, name: str, n: int = 1):
+        """计数器加n"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+    
+    def record_failure(self, category: str, source, error=None):
+        """
+        记录一次失败
+        Args:
+            category: 失败类别，如"airgapflux_csv"、"flux_processing"
+            source: 失败的case编号或文件路径
+            error: 异常对象或说明文字
+        """
+        if isinstance(error, BaseException):
+            error = f"{type(error).__name__}: {error}"
+        with self._lock:
+            self.failures[category] = self.failures.get(category, 0) + 1
+            examples = self.failure_examples.setdefault(category, [])
+            if len(examples) < MAX_FAILURE_EXAMPLES:
+                examples.append(str(source) if error is None else f"{source}: {error}")
+    
+    def merge(self, other: 'PipelineMetrics'):
+        """合并另一个统计对象（如进程池worker返回的统计）"""
+        for stage, (seconds, calls) in other.stages.items():
+            self.add_time(stage, seconds, calls)
+        for name, n in other.counters.items():
+            self.count(name, n)
+        with self._lock:
+            for category, n in other.failures.items():
+                self.failures[category] = self.failures.get(category, 0) + n
+                examples = self.failure_examples.setdefault(category, [])
+                room = MAX_FAILURE_EXAMPLES - len(examples)
+                examples.extend(other.failure_examples.get(category, [])[:max(room, 0)])
+            self.wall_seconds += other.wall_seconds
+    
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+            self.failures.clear()
+            self.failure_examples.clear()
+            self.wall_seconds = 0.0
+    
+    def to_dict(self) -> Dict:
+        """统计结果的字典形式（可直接保存为JSON）"""
+        with self._lock:
+            return {
+                'wall_seconds': self.wall_seconds,
+                'stages': {stage: {'seconds': seconds, 'calls': calls}
+                           for stage, (seconds, calls) in self.stages.items()},
+                'counters': dict(self.counters),
+                'failures': dict(self.failures),
+                'failure_examples': {category: list(examples)
+                                     for category, examples in self.failure_examples.items()},
+            }
+    
+    def to_json(self, path: Optional[str] = None) -> str:
+        """转换为JSON字符串，指定path时同时写入文件"""
+        text = json.dumps(self.to_dict(), indent=2, ensure_ascii=False)
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return text
+    
+    def log(self, target: Optional[logging.Logger] = None, level: int = logging.INFO):
+        """将统计结果逐行输出到日志"""
+        for line in str(self).splitlines():
+            (target or logger).log(level, line)
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    def __str__(self):
+        data = self.to_dict()
+        lines = [f"总耗时 {data['wall_seconds']:.4f} s"]
+        for stage, entry in data['stages'].items():
+            lines.append(f"  {stage:<22}{entry['seconds']:>10.4f} s  {entry['calls']:>8} 次")
+        for name, n in data['counters'].items():
+            lines.append(f"  {name:<22}{n:>10}")
+        for category, n in data['failures'].items():
+            lines.append(f"  失败 {category}: {n}")
+            for example in data['failure_examples'].get(category, []):
+                lines.append(f"    {example}")
+        return '\n'.join(lines)
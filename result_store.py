@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+按列存储的case结果：每个指标一个float64数组，以整数case编号为索引，
+汇总、筛选和排序直接基于这些数组进行，不再逐个case构造字典
+"""
+
+import numpy as np
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# 结果存储中的指标，顺序与get_case_summary的列顺序一致
+RESULT_FIELDS = ['hm_delta', 'hm_dr', 'hm_ds', 'ksat', 'b_av', 'b_delta1',
+                 'b_delta', 'alpha_i', 'k_nm', 'k_w']
+
+
+def format_csv_value(value: Optional[float]) -> str:
+    """汇总CSV中的数值：与pandas的to_csv输出一致（最短往返表示），缺失值为空"""
+    return '' if value is None or np.isnan(value) else repr(float(value))
+
+
+class ResultStore:
+    """所有case标量结果的列式存储，缺失值以NaN保存"""
+    
+    def __init__(self, capacity: int = 64):
+        self.size = 0
+        self._case_ids = np.empty(capacity, dtype=np.int64)
+        self._columns: Dict[str, np.ndarray] = {field: np.empty(capacity) for field in RESULT_FIELDS}
+        self._rows: Dict[int, int] = {}  # case编号 -> 行号
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def __contains__(self, case_id) -> bool:
+        return int(case_id) in self._rows
+    
+    @property
+    def case_ids(self) -> np.ndarray:
+        """所有case编号（按写入顺序）的视图"""
+        return self._case_ids[:self.size]
+    
+    def column(self, field: str) -> np.ndarray:
+        """指定指标的数组视图（按写入顺序）"""
+        return self._columns[field][:self.size]
+    
+    def row_of(self, case_id) -> Optional[int]:
+        """case编号对应的行号，不存在时返回None"""
+        return self._rows.get(int(case_id))
+    
+    def _grow(self, capacity: int):
+        """扩容到至少capacity行（容量倍增）"""
+        new_capacity = max(capacity, 2 * len(self._case_ids))
+        self._case_ids = np.resize(self._case_ids, new_capacity)
+        for field in RESULT_FIELDS:
+            self._columns[field] = np.resize(self._columns[field], new_capacity)
+    
+    def add(self, case_data) -> int:
+        """写入（或覆盖）一个case的标量结果，返回所在行号"""
+        case_id = int(case_data.case_id)
+        row = self._rows.get(case_id)
+        if row is None:
+            if self.size == len(self._case_ids):
+                self._grow(self.size + 1)
+            row = self.size
+            self.size += 1
+            self._rows[case_id] = row
+            self._case_ids[row] = case_id
+        
+        for field in RESULT_FIELDS:
+            self.set_value(field, row, getattr(case_data, field))
+        return row
+    
+    def get_value(self, field: str, row: int) -> Optional[float]:
+        """读取单个值，NaN返回None"""
+        value = self._columns[field][row]
+        return None if np.isnan(value) else value
+    
+    def set_value(self, field: str, row: int, value: Optional[float]):
+        """写入单个值，None保存为NaN"""
+        self._columns[field][row] = np.nan if value is None else value
+    
+    def valid_mask(self, fields: List[str]) -> np.ndarray:
+        """指定指标均不为NaN的行"""
+        mask = np.ones(self.size, dtype=bool)
+        for field in fields:
+            mask &= ~np.isnan(self.column(field))
+        return mask
+    
+    def sort_order(self, field: str = 'case_id') -> Optional[np.ndarray]:
+        """
+        按指定指标升序排列的行号，已经有序时返回None（可直接使用视图，无需重排）
+        """
+        values = self.case_ids if field == 'case_id' else self.column(field)
+        if self.size < 2 or np.all(values[1:] >= values[:-1]):
+            return None
+        return np.argsort(values, kind='stable')
+    
+    def to_frame(self, rows: Optional[np.ndarray] = None, fields: Optional[List[str]] = None) -> 'pd.DataFrame':
+        """
+        构造汇总DataFrame
+        Args:
+            rows: 行号数组或布尔掩码，None表示全部行；为None时各列直接引用存储数组，不复制数据
+            fields: 要包含的指标，None表示全部
+        """
+        import pandas as pd
+        fields = RESULT_FIELDS if fields is None else fields
+        data = {'case_id': self.case_ids}
+        for field in fields:
+            data[field] = self.column(field)
+        if rows is not None:
+            data = {name: values[rows] for name, values in data.items()}
+        return pd.DataFrame(data, copy=False)
+    
+    def write_csv(self, path: str, rows: Optional[np.ndarray] = None):
+        """
+        不经过pandas将汇总结果写为CSV文件（内容与to_frame().to_csv(index=False, encoding='utf-8-sig')相同）
+        Args:
+            rows: 行号数组，None表示全部行（按写入顺序）
+        """
+        case_ids = self.case_ids if rows is None else self.case_ids[rows]
+        columns = [self.column(field) if rows is None else self.column(field)[rows] for field in RESULT_FIELDS]
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            f.write(','.join(['case_id'] + RESULT_FIELDS) + '\n')
+            for i, case_id in enumerate(case_ids.tolist()):
+                f.write(','.join([str(case_id)] + [format_csv_value(values[i]) for values in columns]) + '\n')
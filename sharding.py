@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多参数扫描目录（prmtric.*）的分片处理与合并：
+每个case按(扫描目录名, case编号)的CRC32哈希分配到N个分片之一，各节点只处理自己的分片并写出部分结果，
+合并时检查分片是否齐全、处理参数是否一致，再按扫描目录和case编号排序，结果与单节点运行完全相同
+
+用法:
+    python sharding.py process --shard 0/4 --output-dir shards prmtric.*   # 处理第0片（共4片，序号从0开始）
+    python sharding.py merge shards --shards 4 --output merged_results.csv  # 合并4片的结果
+    python sharding.py local --shards 4 --output-dir shards prmtric.*       # 本机用4个进程分片处理并合并
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import zlib
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from packed_sweep import PACKED_EXT
+from result_store import RESULT_FIELDS
+
+# data_processor导入本模块的shard_of等函数，pandas只在处理和合并分片时导入
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# 未指定扫描目录时的匹配模式
+DEFAULT_SWEEP_PATTERN = "prmtric.*"
+
+# 部分结果和合并结果的列
+SHARD_COLUMNS = ['sweep', 'case_id'] + RESULT_FIELDS
+
+
+def sweep_name(path: str) -> str:
+    """扫描目录名（打包文件去掉扩展名），参与分片哈希和结果排序"""
+    name = os.path.basename(path.rstrip("/\\"))
+    return name[:-len(PACKED_EXT)] if name.endswith(PACKED_EXT) else name
+
+
+def sweep_sort_key(name: str) -> tuple:
+    """扫描目录的排序键：末尾的编号按数值排序（prmtric.2排在prmtric.10之前）"""
+    match = re.match(r'^(.*?)(\d+)$', name)
+    return (match.group(1), int(match.group(2)), name) if match else (name, -1, name)
+
+
+def shard_of(sweep: str, case_id, n_shards: int) -> int:
+    """case所属的分片序号（与进程、平台无关的确定性哈希）"""
+    return zlib.crc32(f"{sweep}/{int(case_id)}".encode('utf-8')) % n_shards
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """解析"i/N"形式的分片参数，序号i从0开始"""
+    try:
+        index, n_shards = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError(f"分片参数应为i/N形式: {text}")
+    if n_shards < 1 or not 0 <= index < n_shards:
+        raise ValueError(f"分片序号应满足0 <= i < N: {text}")
+    return index, n_shards
+
+
+def find_sweeps(patterns: Optional[List[str]] = None) -> List[str]:
+    """
+    按模式查找扫描目录并按sweep_sort_key排序；默认模式只匹配目录，
+    显式给出的打包文件也可以作为扫描目录
+    """
+    if not patterns:
+        paths = [path for path in glob.glob(DEFAULT_SWEEP_PATTERN) if os.path.isdir(path)]
+    else:
+        paths = []
+        for pattern in patterns:
+            paths.extend(path for path in (glob.glob(pattern) or [pattern])
+                         if os.path.isdir(path) or path.endswith(PACKED_EXT))
+    names = [sweep_name(path) for path in paths]
+    if len(set(names)) != len(names):
+        raise ValueError(f"扫描目录名重复: {sorted(names)}")
+    return sorted(set(paths), key=lambda path: sweep_sort_key(sweep_name(path)))
+
+
+def _shard_files(output_dir: str, index: int, n_shards: int) -> Tuple[str, str]:
+    """分片的部分结果文件和说明文件路径"""
+    prefix = os.path.join(output_dir, f"shard-{index}-of-{n_shards}")
+    return prefix + ".csv", prefix + ".json"
+
+
+def process_shard(sweeps: List[str], shard: Tuple[int, int], output_dir: str = "shards",
+                  harmonic_filter_n: int = 5, engine: str = 'full', fast_ingest: bool = True,
+                  batch: bool = True) -> str:
+    """
+    处理所有扫描目录中属于指定分片的case，写出部分结果
+    Args:
+        sweeps: 扫描目录（或打包文件）列表
+        shard: (分片序号, 分片数)
+        output_dir: 部分结果目录
+    Returns:
+        部分结果CSV文件路径
+    """
+    import pandas as pd
+    from data_processor import DataProcessor
+    
+    index, n_shards = shard
+    frames = []
+    for sweep in sweeps:
+        processor = DataProcessor(sweep, fast_ingest=fast_ingest, engine=engine, shard=shard)
+        processor.process_all_cases(harmonic_filter_n, batch=batch)
+        frame = processor.results.to_frame(processor.results.sort_order('case_id'))
+        frame.insert(0, 'sweep', sweep_name(sweep))
+        frames.append(frame)
+    result = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=SHARD_COLUMNS)
+    
+    # 先写临时文件再替换，未完成的分片不会被合并
+    os.makedirs(output_dir, exist_ok=True)
+    csv_file, info_file = _shard_files(output_dir, index, n_shards)
+    result.to_csv(csv_file + ".tmp", index=False, encoding='utf-8')
+    os.replace(csv_file + ".tmp", csv_file)
+    info = {
+        'shard': index,
+        'n_shards': n_shards,
+        'sweeps': [sweep_name(sweep) for sweep in sweeps],
+        'harmonic_filter_n': harmonic_filter_n,
+        'engine': engine,
+        'n_cases': len(result),
+    }
+    with open(info_file + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2)
+    os.replace(info_file + ".tmp", info_file)
+    return csv_file
+
+
+def _latest_shard_count(shard_dir: str) -> Optional[int]:
+    """目录中最近写出的分片说明文件对应的分片数，没有分片结果时返回None"""
+    info_files = glob.glob(os.path.join(shard_dir, "shard-*-of-*.json"))
+    if not info_files:
+        return None
+    match = re.search(r'-of-(\d+)\.json$', max(info_files, key=os.path.getmtime))
+    return int(match.group(1)) if match else None
+
+
+def merge_shards(shard_dir: str, output_file: Optional[str] = None,
+                 n_shards: Optional[int] = None) -> 'pd.DataFrame':
+    """
+    合并分片结果，按扫描目录和case编号排序
+    只读取分片数为n_shards的结果文件（shard-*-of-N），目录中以其他分片数运行留下的文件不参与合并
+    分片不齐全、处理参数不一致、同一case出现在多个分片时抛出ValueError
+    Args:
+        shard_dir: 部分结果目录
+        output_file: 合并结果CSV文件，None时不写文件
+        n_shards: 分片数，None时取目录中最近写出的分片结果的分片数
+    """
+    import pandas as pd
+    if n_shards is None:
+        n_shards = _latest_shard_count(shard_dir)
+    infos: Dict[int, Dict] = {}
+    if n_shards is not None:
+        for info_file in glob.glob(os.path.join(shard_dir, f"shard-*-of-{n_shards}.json")):
+            with open(info_file, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+            infos[info['shard']] = info
+    if not infos:
+        raise ValueError(f"没有找到分片结果: {shard_dir}")
+    
+    first = next(iter(infos.values()))
+    for info in infos.values():
+        for key in ('n_shards', 'sweeps', 'harmonic_filter_n', 'engine'):
+            if info[key] != first[key]:
+                raise ValueError(f"分片的{key}不一致: {info[key]} != {first[key]}")
+    missing = sorted(set(range(n_shards)) - set(infos))
+    if missing:
+        raise ValueError(f"缺少分片: {missing}（共{n_shards}片）")
+    
+    dtypes = {'sweep': str, 'case_id': np.int64}
+    dtypes.update({field: float for field in RESULT_FIELDS})
+    frames = [pd.read_csv(_shard_files(shard_dir, index, n_shards)[0], dtype=dtypes,
+                          float_precision='round_trip') for index in range(n_shards)]
+    merged = pd.concat(frames, ignore_index=True)
+    if merged.duplicated(['sweep', 'case_id']).any():
+        raise ValueError("同一case出现在多个分片中")
+    
+    # 扫描目录按编号排序，目录内按case编号排序
+    sweep_order = {name: i for i, name in enumerate(sorted(first['sweeps'], key=sweep_sort_key))}
+    order = np.lexsort((merged['case_id'].values, merged['sweep'].map(sweep_order).values))
+    merged = merged.iloc[order].reset_index(drop=True)[SHARD_COLUMNS]
+    
+    if output_file is not None:
+        merged.to_csv(output_file, index=False, encoding='utf-8-sig')
+    return merged
+
+
+def run_local(sweeps: List[str], n_shards: int, output_dir: str = "shards",
+              output_file: Optional[str] = None, **kwargs) -> 'pd.DataFrame':
+    """本机用n_shards个进程分别处理各分片后合并，用于验证分片结果与单节点运行一致"""
+    with ProcessPoolExecutor(max_workers=n_shards) as executor:
+        futures = [executor.submit(process_shard, sweeps, (index, n_shards), output_dir, **kwargs)
+                   for index in range(n_shards)]
+        for future in futures:
+            future.result()
+    return merge_shards(output_dir, output_file, n_shards)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="多参数扫描目录的分片处理与合并")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    def add_process_arguments(sub):
+        sub.add_argument('sweeps', nargs='*', help=f"扫描目录或打包文件（可用通配符，默认{DEFAULT_SWEEP_PATTERN}）")
+        sub.add_argument('--output-dir', default="shards", help="部分结果目录")
+        sub.add_argument('--harmonic-filter-n', type=int, default=5, help="谐波滤波次数")
+        sub.add_argument('--engine', default='full', help="计算引擎")
+    
+    process_parser = subparsers.add_parser('process', help="处理一个分片")
+    add_process_arguments(process_parser)
+    process_parser.add_argument('--shard', required=True, help="分片i/N，序号i从0开始")
+    
+    merge_parser = subparsers.add_parser('merge', help="合并分片结果")
+    merge_parser.add_argument('shard_dir', help="部分结果目录")
+    merge_parser.add_argument('--output', default="merged_results.csv", help="合并结果CSV文件")
+    merge_parser.add_argument('--shards', type=int, help="分片数，默认取目录中最近写出的分片结果的分片数")
+    
+    local_parser = subparsers.add_parser('local', help="本机多进程分片处理并合并")
+    add_process_arguments(local_parser)
+    local_parser.add_argument('--shards', type=int, required=True, help="分片数")
+    local_parser.add_argument('--output', default="merged_results.csv", help="合并结果CSV文件")
+    
+    args = parser.parse_args(argv)
+    if args.command == 'process':
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+        csv_file = process_shard(find_sweeps(args.sweeps), shard, args.output_dir,
+                                 args.harmonic_filter_n, args.engine)
+        print(f"分片结果已保存到: {csv_file}")
+    elif args.command == 'merge':
+        merged = merge_shards(args.shard_dir, args.output, args.shards)
+        print(f"已合并 {len(merged)} 个case到: {args.output}")
+    else:
+        merged = run_local(find_sweeps(args.sweeps), args.shards, args.output_dir, args.output,
+                           harmonic_filter_n=args.harmonic_filter_n, engine=args.engine)
+        print(f"已合并 {len(merged)} 个case到: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
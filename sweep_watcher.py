@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+监视模式：求解器逐个写出case目录时，定期扫描参数扫描目录，只处理新出现（或输入文件发生变化）且已写完的case，
+处理后增量更新汇总结果CSV和Ksat曲线图，不必等整个参数扫描结束后再重新运行process_all_cases
+case判定为已写完的条件：output.txt和airgapflux.csv都存在、非空且以换行结束，
+并且两个文件的大小和修改时间在debounce秒内没有变化（或最后修改时间已早于debounce秒之前）
+
+用法:
+    python sweep_watcher.py prmtric.1 --workers 2 --debounce 2 --max-queued 64
+    python sweep_watcher.py prmtric.1 --exit-after-idle 600    # 600秒内没有新case时退出
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from case_cache import CaseCache, INPUT_FILES
+from data_processor import DataProcessor
+
+
+# 默认扫描间隔（秒）
+DEFAULT_POLL_INTERVAL = 5.0
+
+# 默认去抖时间（秒）：输入文件在这段时间内没有变化才认为已写完
+DEFAULT_DEBOUNCE = 2.0
+
+# 默认每次扫描最多排队处理的case数，其余已写完的case留到下一次扫描
+DEFAULT_MAX_QUEUED = 64
+
+
+def case_files_signature(case_dir: str) -> Optional[Tuple]:
+    """
+    case输入文件的(大小, 修改时间)签名，文件不存在、为空或最后一行尚未写完（不以换行结束）时返回None
+    """
+    signature = []
+    for name in INPUT_FILES:
+        path = os.path.join(case_dir, name)
+        try:
+            stat = os.stat(path)
+            if stat.st_size == 0:
+                return None
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    return None
+        except OSError:
+            return None
+        signature.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+class SweepWatcher:
+    """定期扫描参数扫描目录，处理已写完的新case并增量更新汇总结果和曲线图"""
+    
+    def __init__(self, base_dir: str = "prmtric.1", harmonic_filter_n: int = 5, engine: str = 'full',
+                 workers: int = 2, pool: str = "process", debounce: float = DEFAULT_DEBOUNCE,
+                 max_queued: int = DEFAULT_MAX_QUEUED, output_dir: str = "output_results",
+                 summary_file: str = "calculated_results.csv", curves: bool = True,
+                 curves_interval: float = 60.0, cache: bool = True):
+        """
+        Args:
+            base_dir: 参数扫描目录（求解器正在写入的目录）
+            harmonic_filter_n: 谐波滤波次数
+            engine: 计算引擎，见FLUX_ENGINES
+            workers: 处理case的worker数，小于等于1时在当前进程中处理；
+                大于1时进程池（或线程池）在第一次需要时创建，整个监视期间复用，stop()时关闭
+            pool: 并行方式，"process"或"thread"
+            debounce: 去抖时间（秒），输入文件在这段时间内没有变化才处理
+            max_queued: 每次扫描最多排队处理的case数，限制单次处理的工作量和内存
+            output_dir: 汇总结果和曲线图的输出目录
+            summary_file: 汇总结果CSV文件名（列与save_to_csv一致）
+            curves: 是否更新Ksat曲线图
+            curves_interval: 曲线图两次重绘的最小间隔（秒），退出前总是重绘一次
+            cache: 是否使用磁盘缓存（重新启动监视时已处理的case直接读取缓存）
+        """
+        if max_queued < 1:
+            raise ValueError(f"max_queued应为正整数: {max_queued}")
+        if pool not in ("process", "thread"):
+            raise ValueError(f"未知的并行方式: {pool}")
+        self.processor = DataProcessor(base_dir, cache=CaseCache() if cache else None, fast_ingest=True,
+                                       engine=engine, harmonic_filter_n=harmonic_filter_n)
+        self.harmonic_filter_n = harmonic_filter_n
+        self.workers = workers
+        self.pool = pool
+        self.debounce = debounce
+        self.max_queued = max_queued
+        self.output_dir = output_dir
+        self.summary_file = summary_file
+        self.curves = curves
+        self.curves_interval = curves_interval
+        self._pending: Dict[str, Tuple[Tuple, float]] = {}  # case目录 -> (文件签名, 首次看到该签名的时间)
+        self._done: Dict[str, Tuple] = {}  # case目录 -> 处理时的文件签名
+        self._curves_dirty = False
+        self._last_curves = None
+        self._executor: Optional[Executor] = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+    
+    def _get_executor(self) -> Executor:
+        """监视期间复用的进程池（或线程池），避免每次扫描都重新启动worker"""
+        if self._executor is None:
+            executor_cls = ProcessPoolExecutor if self.pool == "process" else ThreadPoolExecutor
+            self._executor = executor_cls(max_workers=self.workers)
+        return self._executor
+    
+    def stop(self):
+        """关闭复用的进程池（或线程池）；之后再次扫描时重新创建"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+    
+    def _is_stable(self, case_dir: str, signature: Tuple, now: float) -> bool:
+        """输入文件签名在debounce秒内没有变化，或最后修改时间已早于debounce秒之前"""
+        pending = self._pending.get(case_dir)
+        if pending is None or pending[0] != signature:
+            pending = self._pending[case_dir] = (signature, now)
+        newest = max(mtime_ns for _, mtime_ns in signature) / 1e9
+        return now - pending[1] >= self.debounce or time.time() - newest >= self.debounce
+    
+    def ready_cases(self) -> List[str]:
+        """
+        扫描参数扫描目录，返回已写完且尚未处理（或处理后输入文件又发生变化）的case目录，
+        按case编号排序，最多max_queued个
+        """
+        now = time.monotonic()
+        ready = []
+        for case_dir in self.processor.get_case_directories():
+            signature = case_files_signature(case_dir)
+            if signature is None:
+                self._pending.pop(case_dir, None)
+                continue
+            if self._done.get(case_dir) == signature:
+                continue
+            if self._is_stable(case_dir, signature, now) and len(ready) < self.max_queued:
+                ready.append(case_dir)
+        return ready
+    
+    def poll(self) -> int:
+        """
+        扫描一次并处理已写完的新case，更新汇总结果CSV（曲线图按curves_interval节流）
+        Returns:
+            本次处理的case数
+        """
+        ready = self.ready_cases()
+        if not ready:
+            return 0
+        
+        signatures = {case_dir: self._pending.pop(case_dir)[0] for case_dir in ready}
+        # 只有一个case时直接在当前进程中处理
+        executor = self._get_executor() if self.workers > 1 and len(ready) > 1 else None
+        results = self.processor.map_case_dirs("process_single_case", ready, (self.harmonic_filter_n,),
+                                               self.workers, self.pool, executor=executor)
+        for case_dir, case_data in zip(ready, results):
+            # 处理失败的case同样记录，输入文件再次变化时才重新处理
+            self._done[case_dir] = signatures[case_dir]
+            if case_data is not None:
+                # 汇总结果和曲线图只需要标量结果
+                case_data.release_waveforms()
+                self.processor.add_case(case_data)
+        
+        self.write_summary()
+        self._curves_dirty = True
+        self.update_curves()
+        return len(ready)
+    
+    def write_summary(self) -> str:
+        """按case编号排序写出汇总结果CSV（先写临时文件再替换，读取方不会看到写了一半的文件）"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        full_path = os.path.join(self.output_dir, self.summary_file)
+        results = self.processor.results
+        results.write_csv(full_path + ".tmp", results.sort_order('case_id'))
+        os.replace(full_path + ".tmp", full_path)
+        return full_path
+    
+    def update_curves(self, force: bool = False):
+        """有新结果且距上次重绘超过curves_interval秒时重绘Ksat曲线图"""
+        if not self.curves or not self._curves_dirty:
+            return
+        now = time.monotonic()
+        if not force and self._last_curves is not None and now - self._last_curves < self.curves_interval:
+            return
+        
+        import visualization
+        visualization.OUTPUT_DIR = self.output_dir
+        valid_data = visualization.select_valid_data(self.processor)
+        if len(valid_data):
+            visualization.create_curves(valid_data)
+        self._curves_dirty = False
+        self._last_curves = time.monotonic()
+    
+    def run(self, poll_interval: float = DEFAULT_POLL_INTERVAL, exit_after_idle: Optional[float] = None,
+            max_polls: Optional[int] = None):
+        """
+        持续扫描直到中断（Ctrl+C）；退出前重绘一次曲线图并关闭进程池
+        Args:
+            poll_interval: 扫描间隔（秒）；本次扫描还有已写完的case未排上队时立即进行下一次扫描
+            exit_after_idle: 连续这么多秒没有新case（也没有等待去抖的case）时退出，None表示一直运行
+            max_polls: 最多扫描次数，None表示不限
+        """
+        last_activity = time.monotonic()
+        polls = 0
+        try:
+            while max_polls is None or polls < max_polls:
+                n_new = self.poll()
+                polls += 1
+                if n_new:
+                    last_activity = time.monotonic()
+                    print(f"已处理 {n_new} 个新case（共 {len(self.processor.cases)} 个）")
+                elif self._pending:
+                    # 还有等待去抖的case
+                    last_activity = time.monotonic()
+                elif exit_after_idle is not None and time.monotonic() - last_activity >= exit_after_idle:
+                    break
+                if n_new < self.max_queued:
+                    time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.update_curves(force=True)
+            self.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="监视参数扫描目录，增量处理求解器新写出的case")
+    parser.add_argument('sweep', nargs='?', default="prmtric.1", help="参数扫描目录")
+    parser.add_argument('--harmonic-filter-n', type=int, default=5, help="谐波滤波次数")
+    parser.add_argument('--engine', default='full', help="计算引擎")
+    parser.add_argument('--workers', type=int, default=2, help="处理case的worker数")
+    parser.add_argument('--pool', default="process", choices=("process", "thread"), help="并行方式")
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL, help="扫描间隔（秒）")
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE, help="输入文件无变化多少秒后才处理")
+    parser.add_argument('--max-queued', type=int, default=DEFAULT_MAX_QUEUED, help="每次扫描最多排队处理的case数")
+    parser.add_argument('--output-dir', default="output_results", help="输出文件夹")
+    parser.add_argument('--no-curves', action='store_true', help="不更新Ksat曲线图")
+    parser.add_argument('--curves-interval', type=float, default=60.0, help="曲线图两次重绘的最小间隔（秒）")
+    parser.add_argument('--exit-after-idle', type=float, help="连续多少秒没有新case时退出")
+    args = parser.parse_args(argv)
+    
+    try:
+        watcher = SweepWatcher(args.sweep, args.harmonic_filter_n, args.engine, args.workers, args.pool,
+                               args.debounce, args.max_queued, args.output_dir,
+                               curves=not args.no_curves, curves_interval=args.curves_interval)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"监视 {args.sweep}（Ctrl+C退出）")
+    watcher.run(args.poll_interval, args.exit_after_idle)
+    print(f"共处理 {len(watcher.processor.cases)} 个case，结果已保存到: "
+          f"{os.path.join(args.output_dir, watcher.summary_file)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,44 +3,67 @@
 """
 统一可视化脚本：合并comprehensive_visualization和formatted_table_output功能
 输出K_W曲线和Ksat对alpha_i、K_Nm、K_W的表格
+matplotlib和pandas只在绘图、输出表格时导入，导入本模块不会加载它们，也不会修改matplotlib的全局设置
 """
 
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from data_processor import DataProcessor
-import matplotlib
+from case_cache import CaseCache
 import os
 
-# 设置中文字体
-matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
-matplotlib.rcParams['axes.unicode_minus'] = False
-
 # 统一输出文件夹
 OUTPUT_DIR = "output_results"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 
-def create_visualization():
-    """创建可视化图表和数据表格"""
+def _pyplot():
+    """导入pyplot并设置中文字体（首次绘图时执行）"""
+    import matplotlib
+    import matplotlib.pyplot as plt
+    
+    # 设置中文字体
+    matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    return plt
+
+
+def create_visualization(processor=None):
+    """
+    创建可视化图表和数据表格
+    Args:
+        processor: 已处理（或延迟加载模式）的DataProcessor，None时读取并处理默认扫描目录
+    """
     # 加载数据
-    processor = DataProcessor()
-    processor.process_all_cases(harmonic_filter_n=5)
+    if processor is None:
+        processor = DataProcessor(cache=CaseCache(), fast_ingest=True)  # 只重新计算新增或变化的case
+        processor.process_all_cases(harmonic_filter_n=5)
     
     if not processor.get_all_cases():
         print("没有找到有效的数据")
         return
     
-    # 获取摘要数据
-    summary_df = processor.get_case_summary()
+    valid_data = select_valid_data(processor)
     
-    # 过滤有效数据并按Ksat排序
-    valid_data = summary_df[summary_df['ksat'].notna() & 
-                           summary_df['alpha_i'].notna() & 
-                           summary_df['k_nm'].notna() &
-                           summary_df['k_w'].notna()].copy()
-    valid_data = valid_data.sort_values('ksat')
+    # 1-3. 创建曲线图
+    create_curves(valid_data)
+    
+    # 4. 输出数据表格
+    create_data_table(valid_data)
     
+    print(f"所有结果已保存到文件夹: {OUTPUT_DIR}")
+    return valid_data
+
+
+def select_valid_data(processor):
+    """在结果存储上过滤ksat、alpha_i、k_nm、k_w均有效的case并按Ksat排序"""
+    results = processor.results
+    rows = np.flatnonzero(results.valid_mask(['ksat', 'alpha_i', 'k_nm', 'k_w']))
+    rows = rows[np.argsort(results.column('ksat')[rows], kind='stable')]
+    return results.to_frame(rows)
+
+
+def create_curves(valid_data):
+    """创建所有曲线图"""
     # 1. 创建综合图表（包含K_W）
     create_comprehensive_plot(valid_data)
     
@@ -49,16 +72,11 @@ def create_visualization():
     
     # 3. 创建原有的alpha_i和K_Nm图表
     create_alpha_knm_plot(valid_data)
-    
-    # 4. 输出数据表格
-    create_data_table(valid_data)
-    
-    print(f"所有结果已保存到文件夹: {OUTPUT_DIR}")
-    return valid_data
 
 
 def create_comprehensive_plot(valid_data):
     """创建包含K_W的综合图表"""
+    plt = _pyplot()
     fig, ax1 = plt.subplots(figsize=(14, 10))
     
     # 第一个y轴：alpha_i
@@ -102,6 +120,7 @@ def create_comprehensive_plot(valid_data):
 
 def create_kw_plot(valid_data):
     """创建K_W单独的图表"""
+    plt = _pyplot()
     plt.figure(figsize=(12, 8))
     plt.plot(valid_data['ksat'], valid_data['k_w'], 
              'o-', color='tab:green', linewidth=2, markersize=6, label='K_W = B_delta/B_delta1')
@@ -119,6 +138,7 @@ def create_kw_plot(valid_data):
 
 def create_alpha_knm_plot(valid_data):
     """创建原有的alpha_i和K_Nm双轴图表"""
+    plt = _pyplot()
     fig, ax1 = plt.subplots(figsize=(12, 8))
     
     # 第一个y轴：alpha_i
@@ -152,6 +172,9 @@ def create_alpha_knm_plot(valid_data):
 
 def create_data_table(valid_data):
     """输出Ksat对alpha_i、K_Nm、K_W的表格"""
+    import pandas as pd
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    
     # 1. 基础数据表格（主要结果）
     table_data = valid_data[['case_id', 'ksat', 'alpha_i', 'k_nm', 'k_w']].copy()
     
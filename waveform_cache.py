@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+case波形数据的内存缓存：按内存上限保留最近访问的case的气隙磁密、延拓、频谱和滤波后波形，
+超出上限时释放最久未访问的case的波形（标量结果始终保留在ResultStore中）。
+被释放的case在再次访问波形属性时由DataProcessor重新读取气隙磁密数据并重新计算，CaseData的属性接口不变。
+"""
+
+from collections import OrderedDict
+
+
+class WaveformCache:
+    """case波形数据的LRU缓存（只做记账和淘汰，波形仍保存在各CaseData中）"""
+    
+    def __init__(self, max_bytes: int = 256 * 1024**2):
+        """
+        Args:
+            max_bytes: 所有case波形数据的内存上限（字节）；最近访问的一个case总是保留，即使其本身超出上限
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.evictions = 0  # 累计释放次数
+        self.reloads = 0  # 累计重新加载次数
+        self._entries: OrderedDict = OrderedDict()  # id(CaseData) -> (CaseData, 字节数)，按访问顺序排列
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, case_data) -> bool:
+        return id(case_data) in self._entries
+    
+    def touch(self, case_data):
+        """记录一次访问：更新该case的波形大小并移到最近访问的位置，超出上限时释放最久未访问的case"""
+        entry = self._entries.pop(id(case_data), None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+        nbytes = case_data.waveform_nbytes()
+        self._entries[id(case_data)] = (case_data, nbytes)
+        self.total_bytes += nbytes
+        
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, (victim, size) = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            victim.evict_waveforms()
+            self.evictions += 1
+    
+    def discard(self, case_data):
+        """不再跟踪该case（不释放其波形）"""
+        entry = self._entries.pop(id(case_data), None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+    
+    def clear(self):
+        """释放所有case的波形"""
+        for case_data, _ in self._entries.values():
+            case_data.evict_waveforms()
+        self.evictions += len(self._entries)
+        self._entries.clear()
+        self.total_bytes = 0
@@ -2,12 +2,43 @@
 # -*- coding: utf-8 -*-
 """
 气隙磁密波形可视化：原始半周期数据和延拓后的完整周期数据
+matplotlib在绘图时才导入
 """
 
-import pandas as pd
+import os
+import json
 import numpy as np
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 from data_processor import DataProcessor
+from case_cache import CaseCache, INPUT_FILES
+from typing import Dict, List, Optional
+
+
+# 批量渲染时记录每张图片渲染参数的文件（参数变化后对应图片重新渲染）
+RENDER_MANIFEST = ".waveform_render.json"
+
+# 多case叠加图中的波形及子图标题
+OVERLAY_SIGNALS = (('full_cycle_flux', 'Extended Full Cycle'), ('filtered_signal', 'Filtered Signal'))
+
+# 多case叠加图中每条波形降采样后的最大点数
+OVERLAY_MAX_POINTS = 400
+
+# 叠加图每次堆叠降采样的case数，限制临时数组的内存占用
+OVERLAY_BLOCK_SIZE = 256
+
+# 每个渲染进程中复用的图表
+_worker_figure = None
+
+
+def full_cycle_coordinates(length_data: np.ndarray) -> np.ndarray:
+    """
+    完整周期对应的长度坐标
+    原始数据对应0到某个长度L，延拓数据从第二个点开始，长度坐标加上偏移量L
+    """
+    max_length = length_data[-1]
+    n_points = len(length_data)
+    extension_length = length_data[1:n_points-1] + max_length  # 从第二个点到倒数第二个点的长度坐标
+    return np.concatenate([length_data, extension_length])
 
 
 def plot_waveforms(case_ids=None, save_individual=False):
@@ -17,16 +48,16 @@ def plot_waveforms(case_ids=None, save_individual=False):
         case_ids: 要绘制的case编号列表，None表示绘制所有case
         save_individual: 是否为每个case单独保存图片
     """
-    # 处理数据
-    processor = DataProcessor()
-    processor.process_all_cases(harmonic_filter_n=10)
+    import matplotlib.pyplot as plt
     
-    if not processor.get_all_cases():
-        print("没有找到有效的case数据")
-        return
+    # 延迟加载：只读取和处理要绘制的case，只重新计算新增或变化的case
+    processor = DataProcessor(cache=CaseCache(), fast_ingest=True, lazy=True, harmonic_filter_n=10)
     
     # 如果没有指定case_ids，则绘制所有case
     if case_ids is None:
+        if not processor.get_all_cases():
+            print("没有找到有效的case数据")
+            return
         case_ids = sorted([int(case_id) for case_id in processor.cases.keys()])
     
     # 设置中文字体（如果需要）
@@ -47,15 +78,8 @@ def plot_waveforms(case_ids=None, save_individual=False):
         full_cycle_data = case_data.full_cycle_flux
         
         # 为完整周期创建对应的长度坐标
-        # 原始数据对应0到某个长度L，延拓数据从第二个点开始
         max_length = length_data[-1]
-        # 延拓部分的长度坐标：从原数据第二个点到倒数第二个点，加上偏移量
-        n_points = len(length_data)
-        extension_length = length_data[1:n_points-1] + max_length  # 从第二个点到倒数第二个点的长度坐标
-        full_cycle_length = np.concatenate([
-            length_data,  # 原始数据
-            extension_length  # 延拓数据（从第二个点到倒数第二个点）
-        ])
+        full_cycle_length = full_cycle_coordinates(length_data)
         
         # 创建图表
         fig, (ax1, ax2, ax3, ax4) = plt.subplots(4, 1, figsize=(12, 14))
@@ -118,6 +142,333 @@ def plot_waveforms(case_ids=None, save_individual=False):
         
         plt.show()
 
+
+class WaveformFigure:
+    """
+    批量渲染用的波形图：不经过pyplot，直接使用Agg画布，
+    坐标轴、图例等只创建一次，每个case只更新曲线数据和标题
+    """
+    
+    def __init__(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        
+        self.figure = Figure(figsize=(12, 14))
+        FigureCanvasAgg(self.figure)
+        ax1, ax2, ax3, ax4 = self.figure.subplots(4, 1)
+        self.axes = (ax1, ax2, ax3, ax4)
+        
+        self.original, = ax1.plot([], [], 'b-', linewidth=2, label='Original Half Cycle')
+        self.full_cycle, = ax2.plot([], [], 'r-', linewidth=2, label='Extended Full Cycle')
+        self.filtered, = ax3.plot([], [], 'g-', linewidth=2, label='Filtered Signal')
+        self.overlay_original, = ax4.plot([], [], 'b-', linewidth=2, label='Original Half Cycle')
+        self.overlay_full_cycle, = ax4.plot([], [], 'r-', linewidth=1.5, alpha=0.7, label='Extended Full Cycle')
+        self.overlay_filtered, = ax4.plot([], [], 'g-', linewidth=1.5, alpha=0.8, label='Filtered Signal')
+        self.mirror_lines = [ax.axvline(x=0, color='k', linestyle='--', alpha=0.7, label='Mirror Point')
+                             for ax in (ax2, ax3, ax4)]
+        
+        self.titles = ['Original Half Cycle Data', 'Extended Full Cycle Data',
+                       'Filtered Signal', 'All Signals Comparison']
+        for ax in self.axes:
+            ax.set_xlabel('Length (mm)')
+            ax.set_ylabel('Magnetic Flux Density (T)')
+            ax.grid(True, alpha=0.3)
+            ax.legend()
+        self._laid_out = False
+    
+    def render(self, case_data, filepath: str, dpi: int = 150):
+        """更新曲线数据为指定case并保存图片"""
+        columns = case_data.flux_columns
+        original_data = columns['Bn']
+        length_data = columns['length']
+        full_cycle_length = full_cycle_coordinates(length_data)
+        full_cycle_data = case_data.full_cycle_flux
+        filtered_signal = case_data.filtered_signal
+        max_length = length_data[-1]
+        
+        self.original.set_data(length_data, original_data)
+        self.full_cycle.set_data(full_cycle_length, full_cycle_data)
+        self.overlay_original.set_data(length_data, original_data)
+        self.overlay_full_cycle.set_data(full_cycle_length, full_cycle_data)
+        if filtered_signal is not None:
+            self.filtered.set_data(full_cycle_length, filtered_signal)
+            self.overlay_filtered.set_data(full_cycle_length, filtered_signal)
+        else:
+            self.filtered.set_data([], [])
+            self.overlay_filtered.set_data([], [])
+        for line in self.mirror_lines:
+            line.set_xdata([max_length, max_length])
+        
+        for ax, title in zip(self.axes, self.titles):
+            ax.set_title(f'Case {case_data.case_id} - {title}')
+            ax.relim()
+            ax.autoscale_view()
+        info_text = (f'Ksat: {_format_value(case_data.ksat)}, alpha_i: {_format_value(case_data.alpha_i)}, '
+                     f'K_Nm: {_format_value(case_data.k_nm)}')
+        self.figure.suptitle(f'Case {case_data.case_id} Waveform Analysis\n{info_text}',
+                             fontsize=14, fontweight='bold')
+        
+        # 各case的坐标轴标签相同，布局只计算一次
+        if not self._laid_out:
+            self.figure.tight_layout()
+            self._laid_out = True
+        self.figure.savefig(filepath, dpi=dpi)
+
+
+def _format_value(value) -> str:
+    """图表标题中的数值，缺失时显示为N/A"""
+    return 'N/A' if value is None else f'{value:.3f}'
+
+
+def waveform_path(output_dir: str, case_id) -> str:
+    """case波形图片的路径（与plot_waveforms保存的文件一致）"""
+    return os.path.join(output_dir, f'waveform_case_{case_id}.png')
+
+
+def _input_mtime(processor: DataProcessor, location) -> Optional[float]:
+    """case输入数据（location为case目录或打包文件中的序号）的最后修改时间，打包文件为整个文件的修改时间"""
+    if processor.packed is not None:
+        return os.path.getmtime(processor.base_dir)
+    try:
+        return max(os.path.getmtime(os.path.join(location, name)) for name in INPUT_FILES)
+    except OSError:
+        return None
+
+
+def _render_cases(processor: DataProcessor, case_ids: List[str], output_dir: str, dpi: int,
+                  release: bool) -> List[str]:
+    """
+    用当前进程复用的图表渲染一组case，返回已渲染的case编号
+    Args:
+        release: 图片保存后是否从处理器中移除该case（处理器只用于本次渲染时）
+    """
+    global _worker_figure
+    if _worker_figure is None:
+        _worker_figure = WaveformFigure()
+    
+    written = []
+    for case_id in case_ids:
+        case_data = processor.get_case_data(case_id)
+        if case_data is None or case_data.flux_columns is None:
+            continue
+        _worker_figure.render(case_data, waveform_path(output_dir, case_id), dpi)
+        written.append(case_id)
+        if release:
+            # 图片已保存，释放该case的波形数据
+            processor.cases.pop(case_id, None)
+    return written
+
+
+def _render_chunk(base_dir: str, case_ids: List[str], output_dir: str, dpi: int,
+                  harmonic_filter_n: int, cache_dir: Optional[str] = ".ksat_cache") -> List[str]:
+    """在渲染进程中处理并渲染一组case，同一进程内复用同一个图表，返回已渲染的case编号"""
+    processor = DataProcessor(base_dir, cache=None if cache_dir is None else CaseCache(cache_dir),
+                              fast_ingest=True, lazy=True, harmonic_filter_n=harmonic_filter_n)
+    return _render_cases(processor, case_ids, output_dir, dpi, release=True)
+
+
+def render_waveforms(case_ids=None, base_dir: str = "prmtric.1", output_dir: str = "output_results",
+                     dpi: int = 150, harmonic_filter_n: int = 10, workers: int = 1,
+                     force: bool = False, processor: Optional[DataProcessor] = None,
+                     cache_dir: Optional[str] = ".ksat_cache") -> List[str]:
+    """
+    批量渲染case波形图片（非交互，不显示窗口），多个case分发到进程池并行渲染
+    图片比case输入数据新且渲染参数（dpi、谐波滤波次数、计算引擎）未变化时跳过
+    Args:
+        case_ids: 要渲染的case编号列表，None表示全部case
+        base_dir: 参数扫描目录或打包文件
+        output_dir: 图片输出目录
+        dpi: 图片分辨率
+        harmonic_filter_n: 谐波滤波次数
+        workers: 并行渲染的进程数，小于等于1时在当前进程中渲染
+        force: 是否忽略已有图片全部重新渲染
+        processor: 已有的DataProcessor（如ksat命令行中各子命令共享的处理结果），
+                   设置时在当前进程中直接使用其中的case渲染，base_dir、harmonic_filter_n和workers不再生效
+        cache_dir: 渲染时处理case使用的磁盘缓存目录，None时不使用缓存（每次都重新读取和计算）
+    Returns:
+        本次渲染的图片路径列表
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    shared = processor is not None
+    if shared:
+        base_dir, harmonic_filter_n = processor.base_dir, processor.harmonic_filter_n
+    else:
+        processor = DataProcessor(base_dir)
+    if case_ids is None:
+        locations = processor.case_index()
+        case_ids = sorted(locations.keys(), key=int)
+    else:
+        # 只查找要渲染的case（按目录名直接定位），不为整个参数扫描目录建立索引
+        locations = {str(case_id): processor.locate_case(str(case_id)) for case_id in case_ids}
+        case_ids = [case_id for case_id, location in locations.items() if location is not None]
+    
+    # 渲染参数与记录不一致或图片早于输入数据时重新渲染
+    manifest_path = os.path.join(output_dir, RENDER_MANIFEST)
+    params = {'dpi': dpi, 'harmonic_filter_n': harmonic_filter_n, 'engine': processor.engine}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    
+    pending = []
+    for case_id in case_ids:
+        filepath = waveform_path(output_dir, case_id)
+        input_mtime = _input_mtime(processor, locations[case_id])
+        if not force and manifest.get(case_id) == params and input_mtime is not None \
+                and os.path.exists(filepath) and os.path.getmtime(filepath) >= input_mtime:
+            continue
+        pending.append(case_id)
+    
+    if shared:
+        written = _render_cases(processor, pending, output_dir, dpi, release=False)
+    elif workers is None or workers <= 1 or len(pending) <= 1:
+        written = _render_chunk(base_dir, pending, output_dir, dpi, harmonic_filter_n, cache_dir)
+    else:
+        # 每个进程约分到4个块，同一进程处理的块复用同一个图表
+        chunksize = max(1, -(-len(pending) // (workers * 4)))
+        chunks = [pending[i:i + chunksize] for i in range(0, len(pending), chunksize)]
+        n_chunks = len(chunks)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_render_chunk, [base_dir] * n_chunks, chunks, [output_dir] * n_chunks,
+                                   [dpi] * n_chunks, [harmonic_filter_n] * n_chunks, [cache_dir] * n_chunks)
+            written = [case_id for chunk_result in results for case_id in chunk_result]
+    
+    for case_id in written:
+        manifest[case_id] = params
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return [waveform_path(output_dir, case_id) for case_id in written]
+
+
+def minmax_decimate(x: np.ndarray, y: np.ndarray, max_points: int = OVERLAY_MAX_POINTS):
+    """
+    min/max分箱降采样：按采样序号将每条波形等分为max_points // 2个箱，每箱按原顺序保留最小值和最大值两个点，
+    峰值和齿谐波造成的尖峰不会被平均或漏掉；多条等长波形堆叠后一次向量化计算
+    Args:
+        x, y: 形状相同的坐标和波形数组，最后一维为采样点
+        max_points: 降采样后的最大点数，采样点数不超过该值时原样返回
+    Returns:
+        降采样后的(x, y)
+    """
+    n_points = y.shape[-1]
+    if n_points <= max_points:
+        return x, y
+    
+    bin_size = -(-n_points // max(1, max_points // 2))
+    n_bins = -(-n_points // bin_size)
+    pad = n_bins * bin_size - n_points
+    if pad:
+        # 以最后一个点补齐最后一个箱，不改变该箱的最小值和最大值
+        widths = [(0, 0)] * (y.ndim - 1) + [(0, pad)]
+        x = np.pad(x, widths, mode='edge')
+        y = np.pad(y, widths, mode='edge')
+    
+    bins = y.reshape(y.shape[:-1] + (n_bins, bin_size))
+    i_min = bins.argmin(axis=-1)
+    i_max = bins.argmax(axis=-1)
+    offsets = np.arange(n_bins) * bin_size
+    index = np.stack([offsets + np.minimum(i_min, i_max), offsets + np.maximum(i_min, i_max)], axis=-1)
+    index = index.reshape(y.shape[:-1] + (2 * n_bins,))
+    return np.take_along_axis(x, index, axis=-1), np.take_along_axis(y, index, axis=-1)
+
+
+def _decimated_lines(case_list: List, field: str, max_points: int) -> List[Optional[np.ndarray]]:
+    """
+    各case指定波形降采样后的(点数, 2)折线，与case_list一一对应，没有该波形的case为None
+    每次取OVERLAY_BLOCK_SIZE个case，按采样点数分组堆叠后批量降采样
+    """
+    lines: List[Optional[np.ndarray]] = [None] * len(case_list)
+    for start in range(0, len(case_list), OVERLAY_BLOCK_SIZE):
+        groups: Dict[int, List[int]] = {}
+        waveforms: Dict[int, np.ndarray] = {}
+        for i in range(start, min(start + OVERLAY_BLOCK_SIZE, len(case_list))):
+            values = getattr(case_list[i], field)
+            if values is not None and case_list[i].flux_columns is not None:
+                waveforms[i] = values
+                groups.setdefault(len(values), []).append(i)
+        
+        for indices in groups.values():
+            y = np.stack([waveforms[i] for i in indices])
+            x = np.stack([full_cycle_coordinates(case_list[i].flux_columns['length']) for i in indices])
+            x, y = minmax_decimate(x, y, max_points)
+            for row, i in enumerate(indices):
+                lines[i] = np.column_stack([x[row], y[row]])
+    return lines
+
+
+def plot_overlay(case_ids=None, base_dir: str = "prmtric.1",
+                 output_path: str = os.path.join("output_results", "waveform_overlay.png"),
+                 max_points: int = OVERLAY_MAX_POINTS, dpi: int = 150, harmonic_filter_n: int = 10,
+                 cmap: str = 'viridis', alpha: Optional[float] = None,
+                 processor: Optional[DataProcessor] = None) -> str:
+    """
+    将多个case的延拓后完整周期波形和滤波后波形叠加绘制在同一张图中，按Ksat着色
+    每条波形先经min/max分箱降采样，所有case的折线作为一个LineCollection绘制（矢量格式中栅格化），
+    渲染时间和图片大小不随case数和采样点数线性增长
+    Args:
+        case_ids: 要绘制的case编号列表，None表示全部case
+        base_dir: 参数扫描目录或打包文件
+        output_path: 图片路径
+        max_points: 每条波形降采样后的最大点数
+        dpi: 图片分辨率
+        harmonic_filter_n: 谐波滤波次数
+        cmap: Ksat着色使用的颜色映射，没有Ksat的case显示为浅灰色
+        alpha: 折线透明度，None时按case数自动确定
+        processor: 已有的DataProcessor，设置时直接使用其中的case，base_dir和harmonic_filter_n不再生效
+    Returns:
+        图片路径
+    """
+    import matplotlib
+    from matplotlib.cm import ScalarMappable
+    from matplotlib.collections import LineCollection
+    from matplotlib.colors import Normalize
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    
+    if processor is None:
+        processor = DataProcessor(base_dir, cache=CaseCache(), fast_ingest=True, lazy=True,
+                                  harmonic_filter_n=harmonic_filter_n)
+    if case_ids is None:
+        case_list = list(processor.get_all_cases().values())
+    else:
+        case_list = [processor.get_case_data(str(case_id)) for case_id in case_ids]
+        case_list = [case_data for case_data in case_list if case_data is not None]
+    
+    # 按Ksat升序绘制，Ksat大的case在上层；没有Ksat的case最先绘制
+    case_list.sort(key=lambda case_data: (case_data.ksat is not None, case_data.ksat or 0.0,
+                                          int(case_data.case_id)))
+    ksat = np.ma.masked_invalid(np.array([np.nan if case_data.ksat is None else case_data.ksat
+                                          for case_data in case_list], dtype=float))
+    valid = ksat.compressed()
+    norm = Normalize(valid.min(), valid.max()) if len(valid) else Normalize(0.0, 1.0)
+    colormap = matplotlib.colormaps[cmap].with_extremes(bad='lightgray')
+    if alpha is None:
+        alpha = min(0.8, max(0.05, 30.0 / max(len(case_list), 1)))
+    
+    figure = Figure(figsize=(12, 9), layout='constrained')
+    FigureCanvasAgg(figure)
+    axes = figure.subplots(len(OVERLAY_SIGNALS), 1, sharex=True)
+    for ax, (field, title) in zip(axes, OVERLAY_SIGNALS):
+        lines = _decimated_lines(case_list, field, max_points)
+        keep = [i for i, line in enumerate(lines) if line is not None]
+        collection = LineCollection([lines[i] for i in keep], array=ksat[keep], cmap=colormap, norm=norm,
+                                    linewidths=0.8, alpha=alpha, rasterized=True)
+        ax.add_collection(collection)
+        ax.autoscale_view()
+        ax.set_title(f'{title} - {len(keep)} Cases')
+        ax.set_ylabel('Magnetic Flux Density (T)')
+        ax.grid(True, alpha=0.3)
+    axes[-1].set_xlabel('Length (mm)')
+    figure.colorbar(ScalarMappable(norm=norm, cmap=colormap), ax=axes, label='Ksat')
+    
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    figure.savefig(output_path, dpi=dpi)
+    return output_path
+
+
 if __name__ == "__main__":
     print("生成波形可视化...")
     